@@ -0,0 +1,174 @@
+# bench_simulator.py
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+'''
+Benchmarks for the Life Simulator hot paths: loading the expenditure data, the peer comparison, the
+sustainability check and the savings projection, at 1, 1k and 100k profiles.
+
+Run from the project root:
+
+    python -m benchmarks.bench_simulator --output after.json --baseline before.json
+
+Each case records the best and median wall time over several repeats and the peak traced memory of one
+extra run. With --baseline, the run fails (exit code 1) if any case is slower or uses more memory than the
+baseline by more than --threshold.
+'''
+
+# The page functions are benchmarked without a Streamlit runtime; they only need `st` to exist at import time
+sys.modules.setdefault('streamlit', types.ModuleType('streamlit'))
+
+import life_simulator  # noqa: E402
+from simulator.expenditure import (parse_expenditure_workbook, load_expenditure_data, compare_spending,  # noqa: E402
+                                   SIMULATOR_CATEGORIES)
+from simulator.projection import project_retirement  # noqa: E402
+
+SIZES = (1, 1_000, 100_000)
+DEFAULT_THRESHOLD = 0.25
+
+# Changes smaller than these are timer or allocator noise and never count as regressions
+MIN_DELTA = {'best_seconds': 0.5e-3, 'peak_memory_bytes': 64 * 1024}
+
+
+def make_profiles(n, seed=0):
+    """Random but reproducible profiles within the ranges of the Life Simulator widgets."""
+    rng = np.random.default_rng(seed)
+    profiles = {
+        'age': rng.integers(20, 60, n),
+        'income': rng.uniform(0, 200_000, n).round(),
+        'savings': rng.uniform(0, 100_000, n).round(),
+        'retirement_age': rng.integers(55, 71, n),
+        'post_retirement_expenses': rng.uniform(500, 6_000, n).round(),
+        'savings_growth_rate': rng.uniform(0, 10, n).round(1),
+        'life_expectancy': rng.integers(70, 101, n),
+        'current_cpf_savings': rng.uniform(0, 300_000, n).round(),
+        'cpf_contribution_rate': rng.uniform(0, 37, n).round(1),
+    }
+    for category in SIMULATOR_CATEGORIES:
+        profiles[category] = rng.uniform(0, 2_000, n).round()
+    return profiles
+
+
+def single_profile(profiles, i=0):
+    return {key: value[i].item() for key, value in profiles.items()}
+
+
+def build_cases():
+    """Return (name, callable) pairs. Setup happens here so it is not timed."""
+    expenditure_data = load_expenditure_data()
+    cases = [
+        ('load_expenditure_data/parse_workbook', parse_expenditure_workbook),
+        ('load_expenditure_data/cached', load_expenditure_data),
+    ]
+
+    for n in SIZES:
+        profiles = make_profiles(n)
+        spending = np.column_stack([profiles[category] for category in SIMULATOR_CATEGORIES])
+
+        if n == 1:
+            profile = single_profile(profiles)
+            cases += [
+                ('map_life_simulator_to_expenditure/1',
+                 lambda profile=profile: life_simulator.map_life_simulator_to_expenditure(profile, expenditure_data)),
+                ('calculate_retirement_sustainability/1',
+                 lambda profile=profile: life_simulator.calculate_retirement_sustainability(profile)),
+                ('projection_path/1', lambda profile=profile: project_retirement(profile)),
+            ]
+        else:
+            cases += [
+                (f'compare_spending/{n}', lambda spending=spending: compare_spending(spending)),
+                (f'sustainability/{n}', lambda profiles=profiles: project_retirement(profiles, with_path=False)),
+                (f'projection_path/{n}', lambda profiles=profiles: project_retirement(profiles)),
+            ]
+    return cases
+
+
+def measure(function, min_repeats=5, min_seconds=0.2):
+    """Time `function` repeatedly, then trace the peak memory of one more call."""
+    function()  # Warm up caches and lazy imports
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_repeats or time.perf_counter() - started < min_seconds:
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+        if len(timings) >= 1000:
+            break
+
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'best_seconds': min(timings),
+        'median_seconds': statistics.median(timings),
+        'repeats': len(timings),
+        'peak_memory_bytes': peak_memory,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """List the cases whose best time or peak memory grew by more than `threshold` (and MIN_DELTA) over the baseline."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('best_seconds', 'peak_memory_bytes'):
+            grown_beyond_threshold = result[metric] > previous[metric] * (1 + threshold)
+            if grown_beyond_threshold and result[metric] - previous[metric] > MIN_DELTA[metric]:
+                regressions.append(f"{name}: {metric} {previous[metric]:.6g} -> {result[metric]:.6g} "
+                                   f"(+{result[metric] / previous[metric] - 1:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Life Simulator hot paths.")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --output")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown or memory growth before failing (default: 0.25)")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'case':<45}{'best (ms)':>12}{'median (ms)':>14}{'peak memory (MB)':>19}")
+    for name, function in build_cases():
+        if args.filter not in name:
+            continue
+        result = measure(function)
+        results[name] = result
+        print(f"{name:<45}{result['best_seconds'] * 1e3:>12.3f}{result['median_seconds'] * 1e3:>14.3f}"
+              f"{result['peak_memory_bytes'] / 2 ** 20:>19.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(),
+                       'numpy': np.__version__, 'results': results}, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)['results']
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions beyond the threshold:")
+            for regression in regressions:
+                print(f"- {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
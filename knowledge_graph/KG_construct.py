@@ -4,6 +4,9 @@ from langchain_openai import OpenAI
 from dotenv import load_dotenv
 import os
 from tqdm import tqdm  # Import tqdm for progress bar
+from llm.answer_cache import AnswerCache
+from knowledge_graph.KG_indexes import create_indexes
+from knowledge_graph.neo4j_pool import driver_config
 
 '''
 This code constructs a knowledge graph from a set of text documents, links it to URLs, and stores it in a Neo4j graph database. 
@@ -11,7 +14,9 @@ It begins by loading environment variables for OpenAI and Neo4j credentials usin
 The JSON data contains content and URLs, which are processed in a loop with a progress bar (tqdm). 
 For each data entry, it extracts the text content and URL, converts the content into graph elements (nodes and relationships) using OpenAI's language model via \
 the LLMGraphTransformer. The nodes are augmented with the URL as a property, then the graph structure (nodes and relationships) is added to the Neo4j graph database \
-using the Neo4jGraph API. Finally, it prints a message indicating the successful completion of the graph construction process.
+using the Neo4jGraph API, with the __Entity__ base label on every node. It then creates the id index the query templates in \
+KG_query.py use (see KG_indexes.py). Finally, it clears the cached Policy Explainer answers, which were built from the old graph, and prints a message \
+indicating the successful completion of the graph construction process. Run it from the project root with `python -m knowledge_graph.KG_construct`.
 
 '''
 
@@ -31,8 +36,8 @@ json_file = "combined_text_output.json"
 with open(json_file, "r", encoding="utf-8") as file:
     data = json.load(file)
 
-# Set up connection to Neo4j
-graph = Neo4jGraph(url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD)
+# Set up connection to Neo4j, with the same connection pool settings as the app
+graph = Neo4jGraph(url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD, driver_config=driver_config())
 
 # Set up the LLM with OpenAI API key
 from langchain_openai import ChatOpenAI
@@ -63,8 +68,17 @@ for entry in tqdm(data, desc="Processing entries"):
             if hasattr(node, 'properties'):
                 node.properties['url'] = url  # Set the URL as a property
 
-    # Add the graph documents (nodes and relationships) into the Neo4j graph
-    graph.add_graph_documents(graph_documents)
+    # Add the graph documents (nodes and relationships) into the Neo4j graph. The __Entity__ base label lets
+    # the queries look nodes up by id through one index, whatever their type
+    graph.add_graph_documents(graph_documents, baseEntityLabel=True)
 
 
+# Index the entity ids the query templates look up, and wait until the index is online so that the first
+# queries against the new graph already use it
+create_indexes(graph.query)
+graph.query("CALL db.awaitIndexes(300)")
+
+# Answers cached from the previous graph are stale now
+AnswerCache().invalidate()
+
 print("Knowledge graph construction completed successfully.")
\ No newline at end of file
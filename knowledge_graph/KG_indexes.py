@@ -0,0 +1,62 @@
+# KG_indexes.py
+
+from knowledge_graph.neo4j_pool import get_driver
+
+'''
+Indexes the Policy Explainer's Cypher templates (see KG_query.py) rely on. Every node the graph builder creates
+carries the __Entity__ label next to its type, and the templates look nodes up by __Entity__ and id, so a range
+index on (__Entity__, id) turns that lookup into an index seek instead of a scan over every node of a label.
+
+KG_construct.py runs this after building the graph. For a graph built before the __Entity__ label was added, run
+it once from the project root with `python -m knowledge_graph.KG_indexes`: it labels the existing nodes first.
+'''
+
+ENTITY_ID_INDEX = "entity_id"
+
+# Nodes of graphs built without the base entity label get it here, in batches so large graphs do not need one
+# huge transaction (this must run in an auto-commit transaction)
+LABEL_ENTITIES_QUERY = """
+MATCH (n)
+WHERE n.id IS NOT NULL AND NOT n:__Entity__
+CALL (n) {
+    SET n:__Entity__
+} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+# The graph builder creates a uniqueness constraint on __Entity__.id, whose index serves the lookups as well,
+# so a separate index is only created if no index covers (__Entity__, id) yet
+EXISTING_ENTITY_ID_INDEX_QUERY = """
+SHOW INDEXES YIELD name, labelsOrTypes, properties
+WHERE labelsOrTypes = ['__Entity__'] AND properties = ['id']
+RETURN name
+"""
+
+CREATE_ENTITY_ID_INDEX_QUERY = f"CREATE RANGE INDEX {ENTITY_ID_INDEX} IF NOT EXISTS FOR (n:__Entity__) ON (n.id)"
+
+
+def create_indexes(run):
+    """
+    Label the graph's entities and create the id index the query templates use.
+
+    Args:
+        run (callable): Runs a Cypher statement and returns its records as a list, for example Neo4jGraph.query.
+
+    Returns:
+        str: The name of the index that serves (__Entity__, id) lookups.
+    """
+    run(LABEL_ENTITIES_QUERY)
+    existing = run(EXISTING_ENTITY_ID_INDEX_QUERY)
+    if existing:
+        return existing[0]['name']
+    run(CREATE_ENTITY_ID_INDEX_QUERY)
+    return ENTITY_ID_INDEX
+
+
+if __name__ == "__main__":
+    driver = get_driver()
+    with driver.session() as session:
+        index_name = create_indexes(lambda query: session.run(query).data())
+        # Wait until the index is online, so the first queries after this already use it
+        session.run("CALL db.awaitIndexes(300)").consume()
+    driver.close()
+    print(f"Entity id lookups are served by index '{index_name}'.")
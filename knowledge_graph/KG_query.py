@@ -1,9 +1,10 @@
-from langchain.chains import GraphCypherQAChain
-from langchain_community.graphs import Neo4jGraph
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts.prompt import PromptTemplate
 from knowledge_graph.schema_utils_module import SchemaUtils  # Import from the renamed module
+from knowledge_graph.neo4j_pool import get_driver, run_query
+from knowledge_graph.references import generate_references
+from services import service
 from dotenv import load_dotenv
+import hashlib
 import os
 
 # Load environment variables from .env file
@@ -17,51 +18,66 @@ NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
-# Set up SchemaUtils
-schema_utils = SchemaUtils(uri=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD)
+# The connections, model and schema embeddings below are built on first use (see services.py), not at import
 
-# Extract schema terms and create embeddings
-schema_terms = schema_utils.extract_schema_terms()
-schema_embeddings = schema_utils.create_schema_embeddings()
+# Set up SchemaUtils, with the schema terms extracted and embedded
+@service
+def get_schema_utils():
+    schema_utils = SchemaUtils(uri=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD, driver=get_driver())
+    schema_utils.extract_schema_terms()
+    schema_utils.create_schema_embeddings()
+    return schema_utils
 
-# Set up Neo4j graph connection
-graph = Neo4jGraph(url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD)
+# Fingerprint of the graph schema, used to key cached answers so they are not reused across a schema change
+@service
+def get_schema_fingerprint():
+    return hashlib.sha256("\n".join(sorted(get_schema_utils().schema_terms)).encode("utf-8")).hexdigest()
 
 # Set up the LLM (OpenAI GPT) for query processing
-llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", api_key=openai_api_key)
-
-# Define a function to generate the Cypher query based on schema terms and node IDs
+@service
+def get_llm():
+    return ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", api_key=openai_api_key)
+
+# Fixed Cypher templates, so that only the parameters change between questions and Neo4j plans each template once.
+# Nodes are looked up through the __Entity__ label every graph node carries, and its id index (see KG_indexes.py)
+KG_RESULT_LIMIT = 25
+
+# The neighbourhood (up to two hops) of the nodes of the matched labels
+NEIGHBOURHOOD_QUERY = """
+MATCH (n:__Entity__)
+WHERE n.id IN $ids
+MATCH (n)-[edge*1..2]-(o)
+RETURN n, edge, o, n.id, o.id
+LIMIT $limit
+"""
+
+# Relationships of the matched types, when no label matched. Dynamic types ($any) need Neo4j 5.26 or later
+RELATIONSHIP_QUERY = """
+MATCH (n:__Entity__)-[relationship:$any($types)]-(o)
+RETURN n, [relationship] AS edge, o, n.id, o.id
+LIMIT $limit
+"""
+
+# Define a function to choose the Cypher query template and its parameters based on schema terms and node IDs.
+# Returns the query, its parameters and an error message (the query and parameters are None if there is an error)
 def find_and_generate_cypher(question):
     # Find the closest schema terms using SchemaUtils
-    matched_terms_with_ids = schema_utils.find_closest_schema_terms(question, threshold=0.5)
+    matched_terms_with_ids = get_schema_utils().find_closest_schema_terms(question, threshold=0.5)
 
     # If no sufficiently similar schema terms are found, return an error message
     if not matched_terms_with_ids['schema']:
-        return None, "Cannot generate a Cypher query: No sufficiently similar schema terms found."
-
-    # Prepare the MATCH clause based on the matched schema terms
-    match_clause = "(n)"
-    where_clauses = []
-
-    # Use matched labels to form the MATCH clause
-    for term in matched_terms_with_ids['schema']:
-        if term['type'] == 'label':
-            label = term['value']
-            if " " in label:
-                label = f"`{label}`"  # Add backticks if the label contains spaces
-            match_clause = f"(n:{label})"
+        return None, None, "Cannot generate a Cypher query: No sufficiently similar schema terms found."
 
-    # If node IDs are present, create a WHERE clause for matching specific node IDs
+    # Start from the nodes of the matched labels if there are any
     if matched_terms_with_ids['node_ids']:
-        node_conditions = " OR ".join([f"n.id = '{node_id}'" for node_id in matched_terms_with_ids['node_ids']])
-        where_clauses.append(f"({node_conditions})")
+        return NEIGHBOURHOOD_QUERY, {'ids': matched_terms_with_ids['node_ids'], 'limit': KG_RESULT_LIMIT}, None
 
-    # Construct the Cypher query
-    match_part = f"MATCH {match_clause}-[edge*1..2]-(o)"
-    where_part = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
-    cypher_query = f"{match_part} {where_part} RETURN n, edge, o, n.id, o.id LIMIT 25;"
+    # Otherwise from the matched relationship types (matched property keys alone do not identify any nodes)
+    relationship_types = [term['value'] for term in matched_terms_with_ids['schema'] if term['type'] == 'relationship']
+    if relationship_types:
+        return RELATIONSHIP_QUERY, {'types': relationship_types, 'limit': KG_RESULT_LIMIT}, None
 
-    return cypher_query, None
+    return None, None, "Cannot generate a Cypher query: No nodes or relationships found for the matched schema terms."
 
 # Function to extract URLs from the query results and generate a structured context
 def extract_urls_and_format_context(query_results):
@@ -95,12 +111,13 @@ def extract_urls_and_format_context(query_results):
 
     return formatted_context, url_map
 
-# Generate a prose response and references section
-def generate_prose_and_references(question, formatted_context, url_map):
-    # Create prompt for generating prose
+# Prompt for the prose answer, built from the formatted KG context
+def build_prose_prompt(question, formatted_context):
     prose_prompt = (
         f"You are an AI system meant to answer retirement or CPF questions. Based on the following information, "
         f"answer the question in the most relevant manner possible: '{question}'\n\n"
+        f"Cite the URL placeholder of every item you use in square brackets, for example [URL1]. "
+        f"Do not write out the URLs themselves.\n\n"
         f"Details:\n"
     )
     for idx, record in enumerate(formatted_context):
@@ -112,52 +129,62 @@ def generate_prose_and_references(question, formatted_context, url_map):
             for relationship in record['relationships']:
                 prose_prompt += f"- {relationship}\n"
         prose_prompt += "\n"
-
-    # Use LLM to generate the prose response
-    prose_response = llm(prose_prompt)
-
-    # Generate references based on the placeholder tags
-    references_prompt = (
-        f"You are an AI system meant to match references for the following text based on the provided URLs:\n\n"
-        f"{prose_response.content}\n\n"
-        f"Below are the available URLs:\n"
-        f"{url_map}\n\n"
-        f"Organize the URLs that match the placeholders in the text into a references section. "
-        f"Use only the URLs provided, and format them as a reference list."
-    )
-
-    references_response = llm(references_prompt)
-
-    # Print generated responses
-    return prose_response.content, references_response.content
-
-# Main process function
-def query_kg_db(question):
-    generated_cypher, error_message = find_and_generate_cypher(question)
+    return prose_prompt
+
+# Run the Cypher query for a question and format its results. Returns (formatted_context, url_map), or None
+# if no query could be generated, it failed, or the graph has nothing for it. Setting the optional `stop`
+# event (a threading.Event) makes a lookup whose result is no longer needed return None before querying.
+def retrieve_kg_context(question, stop=None):
+    # Matching the schema terms queries Neo4j too, and any failure there (an unavailable graph, or a ClientError
+    # from an older server) means no KG context rather than a crashed page, as for the query below
+    try:
+        generated_cypher, parameters, error_message = find_and_generate_cypher(question)
+    except Exception as e:
+        print(f"An error occurred while generating the Cypher query: {str(e)}")
+        return None
 
     if error_message:
         print(f"Error: {error_message}")
-    else:
-        print(f"Generated Cypher Query for '{question}':\n{generated_cypher}")
-
-        # Execute the generated Cypher query
-        result = None
-        try:
-            result = graph.query(generated_cypher)
-            print(f"Query Execution Result:\n{result}")
-
-            # Extract URLs and format context
-            formatted_results, url_map = extract_urls_and_format_context(result)
-            url_list = "\n".join([f"{key}: {value}" for key, value in url_map.items()])
-
-            # Generate prose response and references section
-            prose, references = generate_prose_and_references(question, formatted_results, url_list)
-            # Construct the final output
-            result_output = f"Generated Response:\n{prose}\n\n" + f"Generated References Section:\n{references}\n\n" + "This AI system can make mistakes, even with citations. Please check your information carefully"
-            return result_output
-
-        except Exception as e:
-            print(f"An error occurred while executing the query: {str(e)}")
+        return None
+    print(f"Generated Cypher Query for '{question}':\n{generated_cypher}\nParameters: {parameters}")
+
+    # Execute the generated Cypher query
+    if stop is not None and stop.is_set():
+        return None
+    try:
+        result = run_query(generated_cypher, parameters)
+    except Exception as e:
+        print(f"An error occurred while executing the query: {str(e)}")
+        return None
+    print(f"Query Execution Result:\n{result}")
+    if not result:
+        return None
+
+    # Extract URLs and format context
+    return extract_urls_and_format_context(result)
+
+# Stream the final answer for a retrieved context: the prose token by token as the LLM generates it, then the
+# references section built from its citations
+def stream_kg_answer(question, formatted_context, url_map):
+    yield "Generated Response:\n"
+    prose = []
+    for chunk in get_llm().stream(build_prose_prompt(question, formatted_context)):
+        prose.append(chunk.content)
+        yield chunk.content
+
+    references = generate_references("".join(prose), url_map)
+    yield (f"\n\nGenerated References Section:\n{references}\n\n"
+           "This AI system can make mistakes, even with citations. Please check your information carefully")
+
+# Main process function, returning the whole answer at once
+def query_kg_db(question):
+    context = retrieve_kg_context(question)
+    if context is None:
+        return None
+    try:
+        return "".join(stream_kg_answer(question, *context))
+    except Exception as e:
+        print(f"An error occurred while generating the answer: {str(e)}")
 
 # Example usage
 if __name__ == "__main__":
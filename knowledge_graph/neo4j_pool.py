@@ -0,0 +1,186 @@
+# neo4j_pool.py
+
+from dotenv import load_dotenv
+import asyncio
+import os
+import threading
+import time
+import weakref
+from neo4j import GraphDatabase, AsyncGraphDatabase, Query
+from neo4j.exceptions import ClientError, DriverError, TransientError
+from services import service
+
+'''
+The one Neo4j connection pool of the process, shared by KG_query.py, SchemaUtils and the graph tools, with its
+size and timeouts set from the environment. Queries run through run_query() (or run_query_async() on an
+asyncio path), which gives each query a server-side timeout and guards the instance with a circuit breaker:
+after a few consecutive connection failures or timeouts, queries fail at once with KGUnavailableError for a
+while instead of each waiting for the timeout, so a slow Aura instance sends the Policy Explainer straight to its
+other sources.
+'''
+
+# Load environment variables from .env file
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+
+MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "20"))
+CONNECTION_TIMEOUT_SECONDS = float(os.getenv("NEO4J_CONNECTION_TIMEOUT_SECONDS", "5"))
+# Time a query waits for a free connection when every pooled connection is in use
+ACQUISITION_TIMEOUT_SECONDS = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT_SECONDS", "5"))
+FETCH_SIZE = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
+QUERY_TIMEOUT_SECONDS = float(os.getenv("NEO4J_QUERY_TIMEOUT_SECONDS", "5"))
+# Consecutive failures that open the circuit, and how long it stays open before one query may try again
+BREAKER_FAILURES = int(os.getenv("NEO4J_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("NEO4J_BREAKER_RESET_SECONDS", "30"))
+
+
+class KGUnavailableError(Exception):
+    """The knowledge graph did not answer in time, or recently failed too often to be tried."""
+
+
+def driver_config():
+    """Connection pool settings, for GraphDatabase.driver and for Neo4jGraph(driver_config=...)."""
+    return {
+        'max_connection_pool_size': MAX_POOL_SIZE,
+        'connection_timeout': CONNECTION_TIMEOUT_SECONDS,
+        'connection_acquisition_timeout': ACQUISITION_TIMEOUT_SECONDS,
+    }
+
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise KGUnavailableError if the circuit is open. Once it has been open long enough, one call may try."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_seconds:
+                raise KGUnavailableError("The knowledge graph is unavailable; skipping it for now.")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._consecutive_failures >= self.failures:
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """End a call that neither succeeded nor counted as a failure (a bad query, not a bad connection)."""
+        with self._lock:
+            self._trial_running = False
+
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+
+breaker = CircuitBreaker()
+
+
+def _is_unavailability(error):
+    # Connection problems and timeouts count against the instance; errors in the query itself do not
+    if isinstance(error, (DriverError, TransientError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, ClientError) and "TimedOut" in (error.code or "")
+
+
+@service
+def get_driver():
+    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD), **driver_config())
+
+
+# Async drivers are bound to the event loop they are created in, so there is one per running loop. A driver can
+# only be closed on its own loop, so code that runs a loop of its own awaits close_async_driver() before it ends
+_async_drivers = weakref.WeakKeyDictionary()
+_async_drivers_lock = threading.Lock()
+
+
+def get_async_driver():
+    """The async driver of the running event loop, with the same pool settings as get_driver()."""
+    loop = asyncio.get_running_loop()
+    with _async_drivers_lock:
+        if loop not in _async_drivers:
+            _async_drivers[loop] = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD),
+                                                             **driver_config())
+        return _async_drivers[loop]
+
+
+async def close_async_driver():
+    """Close the running event loop's async driver, if it has one, and release its connection pool."""
+    with _async_drivers_lock:
+        driver = _async_drivers.pop(asyncio.get_running_loop(), None)
+    if driver is not None:
+        await driver.close()
+
+
+def run_query(query, parameters=None, timeout=QUERY_TIMEOUT_SECONDS, driver=None):
+    """
+    Run a read or write query in an auto-commit transaction, guarded by the circuit breaker.
+
+    Args:
+        query (str): The Cypher query.
+        parameters (dict): The query parameters.
+        timeout (float): Seconds after which the server aborts the query (None for no limit).
+        driver: The driver to use, by default the shared one.
+
+    Returns:
+        list: The records as dictionaries, like Neo4jGraph.query.
+    """
+    breaker.before_call()
+    try:
+        with (driver or get_driver()).session(fetch_size=FETCH_SIZE) as session:
+            records = session.run(Query(query, timeout=timeout), parameters or {}).data()
+    except Exception as e:
+        if not _is_unavailability(e):
+            breaker.release()
+            raise
+        breaker.record_failure()
+        raise KGUnavailableError(f"Knowledge graph query failed: {e}") from e
+    breaker.record_success()
+    return records
+
+
+async def run_query_async(query, parameters=None, timeout=QUERY_TIMEOUT_SECONDS):
+    """
+    run_query for asyncio code. The timeout also bounds the whole call on the client side.
+
+    The queries of one event loop share its async driver; await close_async_driver() before the loop ends.
+    """
+    breaker.before_call()
+
+    async def run():
+        async with get_async_driver().session(fetch_size=FETCH_SIZE) as session:
+            result = await session.run(Query(query, timeout=timeout), parameters or {})
+            return await result.data()
+
+    try:
+        # A little over the server timeout, so that the server's own error wins when it is responsive
+        records = await asyncio.wait_for(run(), timeout=timeout + CONNECTION_TIMEOUT_SECONDS if timeout else None)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        if not _is_unavailability(e):
+            breaker.release()
+            raise
+        breaker.record_failure()
+        raise KGUnavailableError(f"Knowledge graph query failed: {e}") from e
+    breaker.record_success()
+    return records
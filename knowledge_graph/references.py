@@ -0,0 +1,29 @@
+# references.py
+
+import re
+
+'''
+The references section of a KG answer. The prose cites the context's URLs through placeholders (URL1, URL2,
+...) that KG_query.py assigns, so the section is built from the citations without another LLM call.
+'''
+
+
+def generate_references(prose, url_map):
+    """
+    Build the references section from the URLn placeholders cited in the prose, in order of first citation.
+
+    Args:
+        prose (str): The generated answer.
+        url_map (dict): Placeholder -> URL, as returned by extract_urls_and_format_context.
+
+    Returns:
+        str: One line per cited placeholder with a known URL. If the prose cites none, every URL of the context
+        is listed as a source instead.
+    """
+    cited = []
+    for placeholder in re.findall(r"\bURL\d+\b", prose):
+        if placeholder in url_map and placeholder not in cited:
+            cited.append(placeholder)
+    if not cited:
+        return "\n".join(["Sources consulted:"] + [f"- {url}" for url in url_map.values()]) if url_map else "No sources available."
+    return "\n".join(f"- [{placeholder}] {url_map[placeholder]}" for placeholder in cited)
@@ -1,10 +1,15 @@
 # schema_utils_module.py
 
 from dotenv import load_dotenv
+import glob
+import hashlib
+import json
 import os
+import re
+import numpy as np
 from neo4j import GraphDatabase
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from llm.embeddings import get_embedding_model, DEFAULT_EMBEDDING_MODEL
+from knowledge_graph.neo4j_pool import driver_config, run_query
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,121 +19,238 @@ NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
+# Schema term embeddings are stored here, so that a restart maps them from disk instead of re-encoding them
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache")
+
+# Node IDs returned per matched label. The traversal built from them returns at most 25 rows anyway, and
+# popular labels would otherwise return every node they have
+MAX_NODE_IDS_PER_LABEL = 100
+
+# IDs of the nodes of every matched label in one round trip. Dynamic labels ($(label)) need Neo4j 5.26 or later
+NODE_IDS_BY_LABEL_QUERY = """
+UNWIND $labels AS label
+CALL (label) {
+    MATCH (n:$(label))
+    WHERE n.id IS NOT NULL AND n.id <> ''
+    RETURN n.id AS id
+    LIMIT $per_label
+}
+RETURN label, collect(id) AS ids
+"""
+
 class SchemaUtils:
-    def __init__(self, uri=None, username=None, password=None, embedding_model_name='all-MiniLM-L6-v2'):
+    def __init__(self, uri=None, username=None, password=None, embedding_model_name=DEFAULT_EMBEDDING_MODEL,
+                 embedding_cache_dir=EMBEDDING_CACHE_DIR, driver=None):
         # Use environment variables if arguments are not provided
         self.uri = uri if uri else NEO4J_URI
         self.username = username if username else NEO4J_USERNAME
         self.password = password if password else NEO4J_PASSWORD
 
-        # Initialize the Neo4j driver
-        self.driver = GraphDatabase.driver(self.uri, auth=(self.username, self.password))
+        # Use the given Neo4j driver (the process-wide pool in the app), or open one with the same pool settings
+        self._owns_driver = driver is None
+        self.driver = driver if driver is not None else \
+            GraphDatabase.driver(self.uri, auth=(self.username, self.password), **driver_config())
         
-        # Initialize the embedding model
-        self.model = SentenceTransformer(embedding_model_name)
+        # Initialize the embedding model (shared with the other users of the same model in this process)
+        self.model = get_embedding_model(embedding_model_name)
+        self.embedding_model_name = embedding_model_name
+        self.embedding_cache_dir = embedding_cache_dir
         self.schema_terms = None
-        self.schema_embeddings = None
+        self.schema_embeddings = None  # L2-normalised float32 matrix, one row per entry of schema_term_array
+        self.schema_term_array = None
         self.schema_mapping = {}
 
     def close(self):
-        """Close the Neo4j connection"""
-        if self.driver is not None:
+        """Close the Neo4j connection, unless it is a shared driver passed in by the caller"""
+        if self.driver is not None and self._owns_driver:
             self.driver.close()
 
     def extract_schema_terms(self):
         """Extract node labels, property keys, and relationships from the Neo4j graph."""
         schema_terms = set()
-        with self.driver.session() as session:
-            # Extract all node labels and store them with their type 'label'
-            result = session.run("CALL db.labels()")
-            for record in result:
-                label = record['label']
-                schema_terms.add(label)
-                self.schema_mapping[label] = {'type': 'label', 'value': label}
-
-            # Extract all property keys and store them with their type 'property'
-            result = session.run("CALL db.propertyKeys()")
-            for record in result:
-                property_key = record['propertyKey']
-                schema_terms.add(property_key)
-                self.schema_mapping[property_key] = {'type': 'property', 'value': property_key}
-
-            # Extract relationship types and store them with their type 'relationship'
-            result = session.run("CALL db.relationshipTypes()")
-            for record in result:
-                relationship_type = record['relationshipType']
-                schema_terms.add(relationship_type)
-                self.schema_mapping[relationship_type] = {'type': 'relationship', 'value': relationship_type}
+        # Extract all node labels and store them with their type 'label'
+        for record in run_query("CALL db.labels()", driver=self.driver):
+            label = record['label']
+            schema_terms.add(label)
+            self.schema_mapping[label] = {'type': 'label', 'value': label}
+
+        # Extract all property keys and store them with their type 'property'
+        for record in run_query("CALL db.propertyKeys()", driver=self.driver):
+            property_key = record['propertyKey']
+            schema_terms.add(property_key)
+            self.schema_mapping[property_key] = {'type': 'property', 'value': property_key}
+
+        # Extract relationship types and store them with their type 'relationship'
+        for record in run_query("CALL db.relationshipTypes()", driver=self.driver):
+            relationship_type = record['relationshipType']
+            schema_terms.add(relationship_type)
+            self.schema_mapping[relationship_type] = {'type': 'relationship', 'value': relationship_type}
 
         self.schema_terms = list(schema_terms)
         return self.schema_terms
 
+    def _encode(self, texts):
+        # One batched call, normalised so that a dot product is the cosine similarity
+        return np.ascontiguousarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def _embedding_store_prefix(self):
+        model_name = self.embedding_model_name.replace('/', '_')
+        return os.path.join(self.embedding_cache_dir, f"schema_embeddings-{model_name}")
+
+    def _load_stored_embeddings(self, prefix, fingerprint):
+        """(terms, read-only memmap) stored for exactly these terms, or None."""
+        try:
+            with open(f"{prefix}-{fingerprint}.json", "r", encoding="utf-8") as file:
+                terms = json.load(file)
+            return terms, np.load(f"{prefix}-{fingerprint}.npy", mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Could not read stored schema embeddings {prefix}-{fingerprint}, re-encoding. Error: {e}")
+            return None
+
+    @staticmethod
+    def _stored_fingerprints(prefix):
+        """Fingerprints of the schemas stored for this model, most recent first."""
+        term_files = [path for path in glob.glob(f"{prefix}-*.json")
+                      if re.fullmatch(r"[0-9a-f]{16}", path[len(prefix) + 1:-len(".json")])]
+        term_files.sort(key=os.path.getmtime, reverse=True)
+        return [path[len(prefix) + 1:-len(".json")] for path in term_files]
+
+    def _latest_stored_embeddings(self, prefix):
+        """(terms, matrix) of the most recently stored schema for this model, to reuse rows from, or None."""
+        for fingerprint in self._stored_fingerprints(prefix):
+            stored = self._load_stored_embeddings(prefix, fingerprint)
+            if stored is not None:
+                return stored
+        return None
+
+    def _store_embeddings(self, prefix, fingerprint, terms, embeddings):
+        # The matrix is written before the term list, so a term list on disk always has its complete matrix
+        os.makedirs(self.embedding_cache_dir, exist_ok=True)
+        temporary = f"{prefix}-{fingerprint}.{os.getpid()}.tmp.npy"
+        np.save(temporary, embeddings)
+        os.replace(temporary, f"{prefix}-{fingerprint}.npy")
+        temporary = f"{prefix}-{fingerprint}.{os.getpid()}.tmp.json"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(terms, file)
+        os.replace(temporary, f"{prefix}-{fingerprint}.json")
+
+        # Older schemas are not needed any more (processes that mapped them keep their open files)
+        for old_fingerprint in self._stored_fingerprints(prefix):
+            if old_fingerprint != fingerprint:
+                for extension in (".json", ".npy"):
+                    try:
+                        os.remove(f"{prefix}-{old_fingerprint}{extension}")
+                    except OSError:
+                        pass
+
     def create_schema_embeddings(self):
-        """Create vector embeddings for schema terms."""
+        """
+        Create vector embeddings for schema terms, as one matrix with a parallel array of terms.
+
+        The matrix is stored on disk keyed by the model and the schema terms, and mapped read-only when a process
+        finds it there. When the schema has changed, only the terms added since the last stored schema are encoded.
+        """
         if self.schema_terms is None:
             raise ValueError("Schema terms have not been extracted yet.")
-        
-        self.schema_embeddings = {term: self.model.encode(term) for term in self.schema_terms}
+
+        terms = sorted(self.schema_terms)
+        prefix = self._embedding_store_prefix()
+        fingerprint = hashlib.sha256("\n".join([self.embedding_model_name] + terms).encode("utf-8")).hexdigest()[:16]
+
+        stored = self._load_stored_embeddings(prefix, fingerprint)
+        if stored is not None and stored[0] == terms:
+            embeddings = stored[1]
+        else:
+            embeddings = np.zeros((len(terms), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+            previous = self._latest_stored_embeddings(prefix)
+            previous_rows = {term: row for row, term in enumerate(previous[0])} if previous is not None else {}
+            added = [i for i, term in enumerate(terms) if term not in previous_rows]
+            for i, term in enumerate(terms):
+                if term in previous_rows:
+                    embeddings[i] = previous[1][previous_rows[term]]
+            if added:
+                embeddings[added] = self._encode([terms[i] for i in added])
+            print(f"Encoded {len(added)} of {len(terms)} schema terms")
+
+            # Storing the embeddings only saves time on the next start, so a failure must not stop this one
+            try:
+                self._store_embeddings(prefix, fingerprint, terms, embeddings)
+                embeddings = np.load(f"{prefix}-{fingerprint}.npy", mmap_mode='r')
+            except Exception as e:
+                print(f"Could not store schema embeddings {prefix}-{fingerprint}. Error: {e}")
+
+        self.schema_term_array = np.array(terms, dtype=object)
+        self.schema_embeddings = embeddings
         return self.schema_embeddings
 
-    def find_closest_schema_terms(self, question, threshold=0.5):
+    def _closest_terms(self, similarities, threshold, top_k):
+        """Indices of the terms above the threshold, most similar first, at most top_k of them."""
+        candidates = np.flatnonzero(similarities > threshold)
+        if top_k is not None and len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-similarities[candidates], top_k - 1)[:top_k]]
+        return candidates[np.argsort(-similarities[candidates], kind='stable')]
+
+    def node_ids_by_label(self, labels, max_ids_per_label=MAX_NODE_IDS_PER_LABEL):
+        """IDs of up to max_ids_per_label nodes for each of the labels, with one parameterized query."""
+        if not labels:
+            return {}
+        result = run_query(NODE_IDS_BY_LABEL_QUERY, {'labels': list(labels), 'per_label': max_ids_per_label},
+                           driver=self.driver)
+        return {record['label']: record['ids'] for record in result}
+
+    def find_closest_schema_terms(self, question, threshold=0.5, top_k=None, max_ids_per_label=MAX_NODE_IDS_PER_LABEL):
         """
         Find the schema terms that are most similar to the user's question using vector similarity.
         
         Args:
             question (str): The user’s question.
             threshold (float): Similarity threshold for accepting a match.
+            top_k (int): Keep at most this many of the closest terms (all above the threshold if None).
+            max_ids_per_label (int): Node IDs returned for each matched label.
 
         Returns:
             dict: A dictionary containing matched schema terms, their types, and corresponding node IDs.
         """
+        return self.find_closest_schema_terms_batch([question], threshold=threshold, top_k=top_k,
+                                                    max_ids_per_label=max_ids_per_label)[0]
+
+    def find_closest_schema_terms_batch(self, questions, threshold=0.5, top_k=None,
+                                        max_ids_per_label=MAX_NODE_IDS_PER_LABEL):
+        """
+        find_closest_schema_terms for several questions, with one embedding call, one matrix product and one
+        Neo4j query for the node IDs of all their matched labels.
+
+        Returns:
+            list: One dictionary per question, as returned by find_closest_schema_terms.
+        """
         if self.schema_embeddings is None:
             raise ValueError("Schema embeddings have not been created yet.")
-        
-        # Create an embedding for the user’s question
-        question_embedding = self.model.encode(question)
-
-        # Calculate cosine similarity with schema embeddings
-        similarities = {
-            term: cosine_similarity([question_embedding], [embedding])[0][0]
-            for term, embedding in self.schema_embeddings.items()
-        }
-
-        # Sort terms based on similarity score
-        sorted_terms = sorted(similarities.items(), key=lambda x: x[1], reverse=True)
-
-        # Filter terms above the threshold
-        matched_terms = [
-            self.schema_mapping[term]
-            for term, similarity in sorted_terms if similarity > threshold
-        ]
-
-        # Get corresponding node IDs for labels and property keys
-        matched_schema_with_ids = {'schema': [], 'node_ids': []}
-        with self.driver.session() as session:
-            for term in matched_terms:
-                if term['type'] == 'label':
-                    # Properly format label for Cypher query (use backticks if label contains spaces)
-                    label = f"`{term['value']}`" if " " in term['value'] else term['value']
-                    # Find nodes that have the label and collect their IDs
-                    result = session.run(f"MATCH (n:{label}) RETURN n.id AS id")
-                    node_ids = [record['id'] for record in result if record['id']]
-                    matched_schema_with_ids['node_ids'].extend(node_ids)
-
-                # Add schema term details to the 'schema' list
-                matched_schema_with_ids['schema'].append(term)
-
-        return matched_schema_with_ids
+
+        # Cosine similarity of every question with every schema term
+        similarities = self._encode(list(questions)) @ self.schema_embeddings.T
+
+        matched_terms = [[self.schema_mapping[self.schema_term_array[i]]
+                          for i in self._closest_terms(row, threshold, top_k)]
+                         for row in similarities]
+
+        # Get corresponding node IDs for the matched labels
+        labels = {term['value'] for terms in matched_terms for term in terms if term['type'] == 'label'}
+        node_ids = self.node_ids_by_label(sorted(labels), max_ids_per_label)
+
+        return [{'schema': terms,
+                 'node_ids': [node_id for term in terms if term['type'] == 'label'
+                              for node_id in node_ids.get(term['value'], [])]}
+                for terms in matched_terms]
 
     def extract_node_ids(self):
         """Extract unique node IDs from the graph."""
         node_ids = set()
-        with self.driver.session() as session:
-            result = session.run("MATCH (n) RETURN DISTINCT n.id AS id")
-            for record in result:
-                if record['id']:
-                    node_ids.add(record['id'])
-        
+        for record in run_query("MATCH (n) RETURN DISTINCT n.id AS id", driver=self.driver):
+            if record['id']:
+                node_ids.add(record['id'])
+
         return list(node_ids)
 
 # Main testing code should be wrapped in if __name__ == "__main__":
@@ -1,80 +1,41 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
 import matplotlib.ticker as mticker
 
+from simulator.projection import project_retirement, PROFILE_FIELDS
+from simulator.monte_carlo import simulate_retirement, FAN_PERCENTILES
+from simulator.goal_seek import solve_retirement_goals
+from simulator.sensitivity import sustainability_grid, CPF_CONTRIBUTION_RATES, GRID_AXES
+from simulator.pipeline import Pipeline, Stage
+from simulator.expenditure import (load_expenditure_data, get_expenditure_index, compare_spending,
+                                    SIMULATOR_CATEGORIES, QUINTILE_LABELS)
 
-# Load the expenditure data (you can adjust the file path)
-def load_expenditure_data():
-    file_path = 'Singstat2018ExpenditureData.xlsx'  # Replace with your file path
-    expenditure_data = pd.read_excel(file_path, skiprows=9)
-    
-    # Rename columns for easier access
-    expenditure_data.columns = ['Type_of_Goods_and_Services', 'Total', 'Income_Quintile_1', 'Income_Quintile_2', 
-                                'Income_Quintile_3', 'Income_Quintile_4', 'Income_Quintile_5']
-
-    # Drop rows where 'Type_of_Goods_and_Services' is NaN
-    expenditure_data = expenditure_data.dropna(subset=['Type_of_Goods_and_Services'])
+# Seed for the Monte Carlo simulation so that reruns with the same inputs show the same chart
+MONTE_CARLO_SEED = 2018
 
-    # Convert expenditure columns to numeric
-    expenditure_data[['Total', 'Income_Quintile_1', 'Income_Quintile_2', 'Income_Quintile_3', 'Income_Quintile_4', 'Income_Quintile_5']] = expenditure_data[
-        ['Total', 'Income_Quintile_1', 'Income_Quintile_2', 'Income_Quintile_3', 'Income_Quintile_4', 'Income_Quintile_5']].apply(pd.to_numeric, errors='coerce')
-
-    # Drop rows with NaN values
-    expenditure_data_cleaned = expenditure_data.dropna(subset=['Total', 'Income_Quintile_1', 'Income_Quintile_2', 'Income_Quintile_3', 'Income_Quintile_4', 'Income_Quintile_5'])
-    return expenditure_data_cleaned
 
 def map_life_simulator_to_expenditure(life_simulator_data, expenditure_data):
-    category_mapping = {
-        'food': ['FOOD AND NON-ALCOHOLIC BEVERAGES', 'FOOD SERVING SERVICES'],  # Updated to include both categories for food
-        'transport': 'TRANSPORT',
-        'travel': 'RECREATION AND CULTURE',
-        'housing': 'Imputed Rental for Owner-Occupied Accommodation',
-        'utilities': 'HOUSING AND UTILITIES',
-        'healthcare': 'HEALTH',
-        'education': 'EDUCATION',
-        'personal_care': 'PERSONAL CARE',
-        'communication': 'COMMUNICATION',
-        'clothing': 'CLOTHING AND FOOTWEAR'
-    }
-
-    # Rename the income quintiles for easier understanding
-    quintile_labels = {
-        'Income_Quintile_1': 'Bottom 20% of Households',
-        'Income_Quintile_2': 'Lower Middle 20% of Households',
-        'Income_Quintile_3': 'Middle 20% of Households',
-        'Income_Quintile_4': 'Upper Middle 20% of Households',
-        'Income_Quintile_5': 'Top 20% of Households',
-    }
+    # Category -> quintile spend vectors are built once per dataset and reused across reruns
+    index = get_expenditure_index(expenditure_data)
+    spending = [life_simulator_data.get(category, 0) for category in SIMULATOR_CATEGORIES]
+    comparison = compare_spending(spending, index)
 
     results = {}
-    
-    for life_category, expenditure_category in category_mapping.items():
-        user_spending = life_simulator_data.get(life_category, 0)
-
-        # Handle the case where food expense is a combination of two categories
-        if life_category == 'food':
-            rows = expenditure_data[expenditure_data['Type_of_Goods_and_Services'].isin(expenditure_category)]
-            total_row = rows.sum(numeric_only=True) if not rows.empty else None
-        else:
-            rows = expenditure_data[expenditure_data['Type_of_Goods_and_Services'] == expenditure_category]
-            total_row = rows.iloc[0] if not rows.empty else None
-
-        if total_row is not None:  # Only proceed if the category exists in the dataset
-            quintile_comparison = {
-                quintile_labels['Income_Quintile_1']: total_row['Income_Quintile_1'],
-                quintile_labels['Income_Quintile_2']: total_row['Income_Quintile_2'],
-                quintile_labels['Income_Quintile_3']: total_row['Income_Quintile_3'],
-                quintile_labels['Income_Quintile_4']: total_row['Income_Quintile_4'],
-                quintile_labels['Income_Quintile_5']: total_row['Income_Quintile_5'],
-            }
-            
-            closest_income_quintile = min(quintile_comparison, key=lambda k: abs(quintile_comparison[k] - user_spending))
-            
+    for position, life_category in enumerate(SIMULATOR_CATEGORIES):
+        closest_quintile = comparison['closest_quintile'][position]
+        if closest_quintile >= 0:  # Only proceed if the category exists in the dataset
             results[life_category] = {
-                'user_spending': user_spending,
-                'closest_income_quintile': closest_income_quintile,
-                'spending_for_quintile': quintile_comparison[closest_income_quintile]
+                'user_spending': spending[position],
+                'closest_income_quintile': QUINTILE_LABELS[closest_quintile],
+                'spending_for_quintile': float(comparison['spending_for_quintile'][position]),
+                'income_percentile': float(comparison['income_percentile'][position]),
             }
 
     return results
@@ -99,6 +60,7 @@ def get_user_input():
     # CPF related inputs
     current_cpf_savings = st.number_input("Enter your current CPF savings (SGD)", min_value=0, value=100000, step=1000)
     cpf_contribution_rate = st.slider("Expected CPF contribution rate (%)", 0.0, 37.0, step=0.5, value=37.0)
+    detailed_cpf = st.checkbox("Use the detailed CPF account model (OA/SA/MA/RA, monthly)")
     
     # Input fields for various expenditures
     transport_cost = st.number_input("Enter your monthly transport cost (SGD)", min_value=0, value=150, step=10)
@@ -123,6 +85,7 @@ def get_user_input():
         'life_expectancy': life_expectancy,
         'current_cpf_savings': current_cpf_savings,
         'cpf_contribution_rate': cpf_contribution_rate,
+        'cpf_model': 'monthly' if detailed_cpf else 'simple',
         'food': food_cost,
         'transport': transport_cost,
         'travel': travel_cost,
@@ -138,43 +101,60 @@ def get_user_input():
     return life_simulator_data
 
 ######################
-# Function to plot savings growth and withdrawals in a line chart
-import matplotlib.ticker as mticker
+# Rendered charts are kept as PNG bytes in a bounded LRU cache keyed on the inputs that determine them.
+# Unchanged charts then cost nothing on a rerun, and every figure is closed right after rendering so
+# figures do not pile up in long-lived server processes.
+CHART_CACHE_SIZE = 128
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+
+
+def chart_key(name, *inputs):
+    """Build a compact cache key from scalars and NumPy arrays."""
+    digest = hashlib.sha1()
+    for value in inputs:
+        if isinstance(value, np.ndarray):
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode())
+        digest.update(b'|')
+    return name, digest.hexdigest()
+
+
+def render_chart(key, draw):
+    """Return the PNG for `key`, calling `draw()` to build the figure only on a cache miss."""
+    with _chart_cache_lock:
+        png = _chart_cache.get(key)
+        if png is not None:
+            _chart_cache.move_to_end(key)
+            return png
+
+    fig = draw()
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    png = buffer.getvalue()
+
+    with _chart_cache_lock:
+        _chart_cache[key] = png
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return png
 
-def plot_savings_projection_with_withdrawals(life_simulator_data, retirement_plan):
-    current_age = life_simulator_data['age']
+
+# Function to plot savings growth and withdrawals in a line chart
+def _draw_savings_projection_with_withdrawals(life_simulator_data, retirement_plan, projection=None):
     retirement_age = life_simulator_data['retirement_age']
-    life_expectancy = life_simulator_data['life_expectancy']
-    years_until_retirement = retirement_age - current_age
-    years_in_retirement = life_expectancy - retirement_age
-
-    # Simulate savings growth until retirement
-    savings = life_simulator_data['savings']
-    cpf_savings = life_simulator_data['current_cpf_savings']
-    growth_rate = life_simulator_data['savings_growth_rate'] / 100
-    savings_over_time = []
-    cpf_over_time = []
-    
-    # CPF contributions and savings growth until retirement
-    for year in range(years_until_retirement):
-        annual_cpf_contributions = life_simulator_data['income'] * life_simulator_data['cpf_contribution_rate'] / 100
-        cpf_savings += annual_cpf_contributions  # CPF contributions every year
-        cpf_savings *= (1 + growth_rate)  # CPF grows every year
-        savings *= (1 + growth_rate)  # Personal savings grow every year
-        cpf_over_time.append(cpf_savings)
-        savings_over_time.append(savings)
-
-    # Combine CPF and savings
-    total_savings = [s + c for s, c in zip(savings_over_time, cpf_over_time)]
-
-    # Simulate withdrawals after retirement
     monthly_withdrawal = retirement_plan['monthly_withdrawal']
-    for year in range(years_in_retirement):
-        total_savings[-1] -= monthly_withdrawal * 12  # Subtract yearly withdrawal
-        total_savings.append(max(total_savings[-1], 0))  # Ensure savings don't go negative
 
-    # Create the timeline (age)
-    ages = list(range(current_age, current_age + len(total_savings)))
+    # Age-indexed CPF + personal savings path, including withdrawals after retirement
+    if projection is None:
+        projection = project_retirement(life_simulator_data, cpf_model=life_simulator_data.get('cpf_model', 'simple'))
+    ages = projection['ages']
+    total_savings = projection['total']
+    retired = ages >= projection['drawdown_start_age']
 
     # Plot savings projection
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -183,8 +163,8 @@ def plot_savings_projection_with_withdrawals(life_simulator_data, retirement_pla
     ax.axhline(0, color='black', linewidth=0.5)
 
     # Highlight the withdrawal period with annotation
-    if years_in_retirement > 0:
-        ax.fill_between(ages[years_until_retirement:], total_savings[years_until_retirement:], color='lightcoral', alpha=0.3, label="Withdrawal Period")
+    if retired.sum() > 1:
+        ax.fill_between(ages[retired], total_savings[retired], color='lightcoral', alpha=0.3, label="Withdrawal Period")
         ax.text(retirement_age + 1, monthly_withdrawal * 12, f"Monthly Withdrawal: SGD {monthly_withdrawal:,.0f}", color='red', fontsize=10)
 
     # Fill under the curve for total savings visualization
@@ -197,7 +177,7 @@ def plot_savings_projection_with_withdrawals(life_simulator_data, retirement_pla
     ax.legend()
 
     # Set Y-axis limit to cap large values for readability
-    max_y = max(total_savings) * 1.1  # Add a small margin above the max value
+    max_y = max(total_savings.max() * 1.1, 1)  # Add a small margin above the max value
     ax.set_ylim(0, max_y)
 
     # Turn off scientific notation on the Y-axis
@@ -207,72 +187,180 @@ def plot_savings_projection_with_withdrawals(life_simulator_data, retirement_pla
     # Optionally format large numbers with commas for better readability
     ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f'{int(x):,}'))
 
-    # Show plot in Streamlit
-    st.pyplot(fig)
-
+    return fig
 
 
-# Function to calculate if the user can sustain their lifestyle during retirement
-def calculate_retirement_sustainability(life_simulator_data):
-    current_age = life_simulator_data['age']
+# Function to plot the P10/P50/P90 bands of a Monte Carlo simulation as a fan chart
+def _draw_monte_carlo_fan_chart(life_simulator_data, simulation):
     retirement_age = life_simulator_data['retirement_age']
-    post_retirement_expenses = life_simulator_data['post_retirement_expenses']
-    savings_growth_rate = life_simulator_data['savings_growth_rate'] / 100  # Convert to decimal
-    current_cpf_savings = life_simulator_data['current_cpf_savings']
-    cpf_contribution_rate = life_simulator_data['cpf_contribution_rate'] / 100  # Convert to decimal
-    life_expectancy = life_simulator_data['life_expectancy']
-    annual_income = life_simulator_data['income']
-    current_savings = life_simulator_data['savings']
-    
-    # Calculate the number of years before retirement and the number of years post-retirement
-    years_until_retirement = retirement_age - current_age
-    years_of_retirement = life_expectancy - retirement_age
-    
-    # CPF contributions until retirement
-    annual_cpf_contributions = annual_income * cpf_contribution_rate
-    total_cpf_contributions_until_retirement = annual_cpf_contributions * years_until_retirement
+    ages = simulation['ages']
+    p10, p50, p90 = (simulation['percentiles'][p] for p in FAN_PERCENTILES)
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.fill_between(ages, p10, p90, color='lightgreen', alpha=0.5, label="P10 - P90 Range")
+    ax.plot(ages, p50, label="Median Total Savings (CPF + Personal)", color='green', linewidth=2)
+    ax.plot(ages, p10, color='darkorange', linestyle=':', linewidth=1.5, label="P10 (Pessimistic)")
+    ax.plot(ages, p90, color='darkgreen', linestyle=':', linewidth=1.5, label="P90 (Optimistic)")
+    ax.axvline(retirement_age, color='red', linestyle='--', linewidth=1.5, label="Retirement Age")
+    ax.axhline(0, color='black', linewidth=0.5)
 
-    # Total savings at the time of retirement (CPF savings + personal savings)
-    total_savings_at_retirement = current_savings + current_cpf_savings + total_cpf_contributions_until_retirement
+    # Labels and title
+    ax.set_xlabel("Age")
+    ax.set_ylabel("Total Savings (SGD)")
+    ax.set_title(f"Retirement Savings Projection ({simulation['n_paths']:,} Simulated Paths)")
+    ax.legend()
+    ax.set_ylim(0, max(p90.max() * 1.1, 1))
+
+    # Format large numbers with commas for better readability
+    ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f'{int(x):,}'))
+
+    return fig
+
+
+
+# Function to plot the retirement surplus/shortfall over growth rate x retirement age as a heatmap
+def _draw_sensitivity_heatmap(life_simulator_data, grid, cpf_contribution_rate):
+    rate_index = int(np.abs(grid['cpf_contribution_rates'] - cpf_contribution_rate).argmin())
+    surplus = grid['surplus'][:, :, rate_index]
+    growth_rates = grid['growth_rates']
+    retirement_ages = grid['retirement_ages']
+
+    # Diverging colours centred on zero: green for a surplus, red for a shortfall
+    limit = max(np.abs(surplus).max(), 1)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    image = ax.imshow(surplus, origin='lower', aspect='auto', cmap='RdYlGn', vmin=-limit, vmax=limit,
+                      extent=(retirement_ages[0] - 0.5, retirement_ages[-1] + 0.5,
+                              growth_rates[0] - 0.05, growth_rates[-1] + 0.05))
+    if surplus.min() < 0 < surplus.max():
+        ax.contour(retirement_ages, growth_rates, surplus, levels=[0], colors='black', linewidths=1.5)
+    ax.plot(life_simulator_data['retirement_age'], life_simulator_data['savings_growth_rate'], marker='o',
+            color='black', label="Your Current Plan")
+
+    # Labels and title
+    ax.set_xlabel("Retirement Age")
+    ax.set_ylabel("Annual Growth Rate on Savings (%)")
+    ax.set_title(f"Retirement Surplus / Shortfall at {grid['cpf_contribution_rates'][rate_index]:.1f}% CPF Contribution Rate")
+    ax.legend(loc='upper left')
+    colorbar = fig.colorbar(image, ax=ax, format=mticker.FuncFormatter(lambda x, _: f'{int(x):,}'))
+    colorbar.set_label("Surplus (SGD)")
+
+    return fig
+
+
+# Functions to render the charts (as PNG bytes) through the render cache, and to show them
+def savings_projection_chart(life_simulator_data, retirement_plan, projection=None):
+    key = chart_key('savings_projection', [life_simulator_data[field] for field in PROFILE_FIELDS],
+                    life_simulator_data.get('cpf_model', 'simple'), retirement_plan['monthly_withdrawal'])
+    return render_chart(key, lambda: _draw_savings_projection_with_withdrawals(life_simulator_data, retirement_plan,
+                                                                               projection))
+
+
+def monte_carlo_fan_chart(life_simulator_data, simulation):
+    key = chart_key('monte_carlo', life_simulator_data['retirement_age'], simulation['n_paths'], simulation['ages'],
+                    *simulation['percentiles'].values())
+    return render_chart(key, lambda: _draw_monte_carlo_fan_chart(life_simulator_data, simulation))
+
+
+def sensitivity_heatmap(life_simulator_data, grid, cpf_contribution_rate):
+    rate_index = int(np.abs(grid['cpf_contribution_rates'] - cpf_contribution_rate).argmin())
+    key = chart_key('sensitivity', life_simulator_data['retirement_age'], life_simulator_data['savings_growth_rate'],
+                    grid['cpf_contribution_rates'][rate_index], grid['surplus'][:, :, rate_index])
+    return render_chart(key, lambda: _draw_sensitivity_heatmap(life_simulator_data, grid, cpf_contribution_rate))
+
+
+def plot_savings_projection_with_withdrawals(life_simulator_data, retirement_plan):
+    st.image(savings_projection_chart(life_simulator_data, retirement_plan))
+
+
+# Function to calculate if the user can sustain their lifestyle during retirement
+def calculate_retirement_sustainability(life_simulator_data, projection=None):
+    # Savings at retirement and the drawdown come from the shared projection engine
+    if projection is None:
+        projection = project_retirement(life_simulator_data, with_path=False,
+                                        cpf_model=life_simulator_data.get('cpf_model', 'simple'))
 
-    # Apply savings growth rate until retirement
-    total_savings_at_retirement *= (1 + savings_growth_rate) ** years_until_retirement
-    
-    # Project total post-retirement expenses based on actual expected expenses
-    total_post_retirement_expenses = post_retirement_expenses * 12 * years_of_retirement
-    
     # Ensure that the monthly withdrawal is based on the user's actual post-retirement expenses
-    monthly_withdrawal = post_retirement_expenses  # This should reflect their actual monthly cost
+    monthly_withdrawal = life_simulator_data['post_retirement_expenses']  # This should reflect their actual monthly cost
+
+    retirement_plan = {
+        'total_savings_at_retirement': projection['total_savings_at_retirement'],
+        'total_post_retirement_expenses': projection['total_post_retirement_expenses'],
+        'monthly_withdrawal': monthly_withdrawal,  # Return the correct monthly withdrawal
+        'depletion_age': projection['depletion_age'],
+        'cpf_accounts': projection.get('cpf_accounts'),  # Only with the detailed CPF model
+    }
 
     # Determine if the user's savings can support their lifestyle during retirement
-    if total_savings_at_retirement >= total_post_retirement_expenses:
-        return {
+    if projection['sustainable']:
+        retirement_plan.update({
             'status': 'Sustainable',
-            'total_savings_at_retirement': total_savings_at_retirement,
-            'total_post_retirement_expenses': total_post_retirement_expenses,
-            'monthly_withdrawal': monthly_withdrawal,  # Return the correct monthly withdrawal
             'message': 'Your retirement plan is sustainable. You have enough savings to cover your expenses.'
-        }
+        })
     else:
-        return {
+        retirement_plan.update({
             'status': 'Not Sustainable',
-            'total_savings_at_retirement': total_savings_at_retirement,
-            'total_post_retirement_expenses': total_post_retirement_expenses,
-            'monthly_withdrawal': monthly_withdrawal,  # Return the correct monthly withdrawal
             'message': 'Your retirement plan is not sustainable. You may run out of savings before your estimated lifespan.'
-        }
+        })
+    return retirement_plan
     
 
 
 ######################
+# The page as a dependency graph of stages. Each stage only reads the inputs it declares, so a widget change
+# recomputes just the stages downstream of it and the rest is reused from the previous rerun.
+PROJECTION_INPUTS = PROFILE_FIELDS + ('cpf_model',)
+MONTE_CARLO_INPUTS = PROFILE_FIELDS + ('return_volatility', 'inflation_rate', 'inflation_volatility')
+
+SIMULATOR_PIPELINE = Pipeline([
+    Stage('data', lambda inputs, upstream: load_expenditure_data()),
+    Stage('comparison', lambda inputs, upstream: map_life_simulator_to_expenditure(inputs, upstream['data']),
+          inputs=SIMULATOR_CATEGORIES, depends=['data']),
+    Stage('projection', lambda inputs, upstream: project_retirement(inputs, cpf_model=inputs['cpf_model']),
+          inputs=PROJECTION_INPUTS),
+    Stage('sustainability',
+          lambda inputs, upstream: calculate_retirement_sustainability(inputs, upstream['projection']),
+          inputs=['post_retirement_expenses'], depends=['projection']),
+    Stage('goals', lambda inputs, upstream: solve_retirement_goals(inputs, cpf_model=inputs['cpf_model']),
+          inputs=PROJECTION_INPUTS),
+    Stage('chart',
+          lambda inputs, upstream: savings_projection_chart(inputs, upstream['sustainability'], upstream['projection']),
+          inputs=PROJECTION_INPUTS, depends=['projection', 'sustainability']),
+    Stage('grid', lambda inputs, upstream: sustainability_grid(inputs),
+          inputs=[field for field in PROFILE_FIELDS if field not in GRID_AXES]),
+    Stage('heatmap',
+          lambda inputs, upstream: sensitivity_heatmap(inputs, upstream['grid'], inputs['grid_cpf_contribution_rate']),
+          inputs=['retirement_age', 'savings_growth_rate', 'grid_cpf_contribution_rate'], depends=['grid']),
+    Stage('monte_carlo',
+          lambda inputs, upstream: simulate_retirement(inputs, n_paths=10_000, seed=MONTE_CARLO_SEED,
+                                                       return_volatility=inputs['return_volatility'],
+                                                       inflation_rate=inputs['inflation_rate'],
+                                                       inflation_volatility=inputs['inflation_volatility']),
+          inputs=MONTE_CARLO_INPUTS),
+    Stage('fan_chart', lambda inputs, upstream: monte_carlo_fan_chart(inputs, upstream['monte_carlo']),
+          inputs=['retirement_age'], depends=['monte_carlo']),
+])
+
+
+def show_stage_timings(run):
+    # Per-stage wall time of this rerun, to confirm which stages were skipped
+    with st.expander("Stage timings"):
+        st.table(pd.DataFrame([
+            {'Stage': name, 'Time (ms)': f"{timing['seconds'] * 1e3:.2f}",
+             'Status': 'Recomputed' if timing['recomputed'] else 'Reused'}
+            for name, timing in run.timings.items()
+        ]))
 
-def life_simulator():
-    expenditure_data = load_expenditure_data()  # Load expenditure data
 
+def life_simulator():
     life_simulator_data = get_user_input()  # Get user inputs
-    
+
+    # Stage results are kept per browser session and reused across reruns
+    if 'simulator_pipeline' not in st.session_state:
+        st.session_state['simulator_pipeline'] = {}
+    run = SIMULATOR_PIPELINE.run(life_simulator_data, st.session_state['simulator_pipeline'])
+
     # Compare user's spending to the expenditure data
-    comparison_results = map_life_simulator_to_expenditure(life_simulator_data, expenditure_data)
+    comparison_results = run['comparison']
     
     # Display spending comparison results
     st.subheader("Comparison to Average Household Expenditure")
@@ -280,21 +368,78 @@ def life_simulator():
         st.write(f"Category: {category.capitalize()}")
         st.write(f"- Your Spending: SGD {result['user_spending']}")
         st.write(f"- Closest Income Group: {result['closest_income_quintile']}")
-        st.write(f"- Average Spending in this Group: SGD {result['spending_for_quintile']}")
+        st.write(f"- Average Spending in this Group: SGD {result['spending_for_quintile']:,.1f}")
+        st.write(f"- Comparable Household Income Percentile: {result['income_percentile']:.0f}")
         st.write("")
 
 
     # Calculate and display retirement sustainability check
-    retirement_plan = calculate_retirement_sustainability(life_simulator_data)
+    retirement_plan = run['sustainability']
     st.subheader("Retirement Sustainability Check")
-    st.write(f"Total Savings at Retirement: SGD {retirement_plan['total_savings_at_retirement']:,}")
-    st.write(f"Total Expected Post-Retirement Expenses: SGD {retirement_plan['total_post_retirement_expenses']:,}")
+    st.write(f"Total Savings at Retirement: SGD {retirement_plan['total_savings_at_retirement']:,.0f}")
+    st.write(f"Total Expected Post-Retirement Expenses: SGD {retirement_plan['total_post_retirement_expenses']:,.0f}")
+    if retirement_plan['cpf_accounts'] is not None:
+        accounts = retirement_plan['cpf_accounts']
+        st.write(f"CPF balances at retirement: OA SGD {accounts['oa']:,.0f}, SA SGD {accounts['sa']:,.0f}, "
+                 f"RA SGD {accounts['ra']:,.0f}, MediSave SGD {accounts['ma']:,.0f} (kept for healthcare)")
     st.write(retirement_plan['message'])
+    if retirement_plan['status'] == 'Not Sustainable':
+        st.write(f"Your savings are projected to run out at around age {retirement_plan['depletion_age']:.0f}.")
+
+    # Solve directly for what makes the plan sustainable instead of trial and error with the sliders
+    goals = run['goals']
+    st.subheader("What It Takes to Be Sustainable")
+    st.write(f"- Earliest sustainable retirement age: {goals['earliest_sustainable_retirement_age']:.0f}")
+    if np.isnan(goals['max_sustainable_monthly_expense']):
+        st.write("- Maximum sustainable monthly post-retirement expenses: no drawdown period (retirement is at or "
+                 "after life expectancy)")
+    else:
+        st.write(f"- Maximum sustainable monthly post-retirement expenses: SGD {goals['max_sustainable_monthly_expense']:,.0f}")
+    if retirement_plan['status'] == 'Not Sustainable':
+        st.write(f"- Extra savings needed today: SGD {goals['required_lump_sum']:,.0f}")
+        if goals['required_monthly_savings'] != float('inf'):  # No time left to save once retired
+            st.write(f"- Or extra savings per month until retirement: SGD {goals['required_monthly_savings']:,.0f}")
+
+    # What-if grid over growth rate x retirement age x CPF contribution rate, computed in one pass. The body of
+    # an expander runs even while it is collapsed, so the grid is behind a checkbox and costs nothing when hidden
+    if st.checkbox("Show what-if grid: growth rate x retirement age"):
+        grid_cpf_rate = st.select_slider("CPF contribution rate for the grid (%)", options=list(CPF_CONTRIBUTION_RATES),
+                                         value=min(CPF_CONTRIBUTION_RATES, key=lambda rate: abs(rate - life_simulator_data['cpf_contribution_rate'])))
+        st.write("Each cell shows savings at retirement minus expenses over retirement. The black line marks where the plan becomes sustainable.")
+        if life_simulator_data.get('cpf_model') == 'monthly':
+            st.write("The grid uses the simple CPF model.")
+        run.data['grid_cpf_contribution_rate'] = grid_cpf_rate
+        st.image(run['heatmap'])
+
+    # Optionally replace the single projection with a Monte Carlo simulation of returns and inflation
+    st.subheader("Savings Projection")
+    if st.checkbox("Simulate market uncertainty (Monte Carlo)"):
+        return_volatility = st.slider("Volatility of annual returns (%)", 0.0, 20.0, step=0.5, value=6.0)
+        inflation_rate = st.slider("Expected annual inflation (%)", 0.0, 10.0, step=0.1, value=2.0)
+        inflation_volatility = st.slider("Volatility of annual inflation (%)", 0.0, 5.0, step=0.1, value=1.0)
+
+        # A fixed seed keeps the result stable across Streamlit reruns
+        run.data.update(return_volatility=return_volatility, inflation_rate=inflation_rate,
+                        inflation_volatility=inflation_volatility)
+        simulation = run['monte_carlo']
+        st.write(f"Probability of running out of savings before age {life_simulator_data['life_expectancy']}: "
+                 f"{simulation['probability_of_ruin']:.1%}")
+        if life_simulator_data.get('cpf_model') == 'monthly':
+            st.write("The simulation uses the simple CPF model.")
+        st.image(run['fan_chart'])
+    else:
+        # Visualize savings projection with withdrawals
+        st.image(run['chart'])
 
-    # Visualize savings projection with withdrawals
-    plot_savings_projection_with_withdrawals(life_simulator_data, retirement_plan)
+    show_stage_timings(run)
 
-# Directly call the function in the script's main block
+# Directly call the function in the script's main block, or run headless with `python -m life_simulator batch ...`
 if __name__ == "__main__":
-    life_simulator()
+    import sys
+
+    if sys.argv[1:2] == ["batch"]:
+        from simulator.batch import main
+        main(sys.argv[2:])
+    else:
+        life_simulator()
 
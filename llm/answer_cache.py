@@ -0,0 +1,146 @@
+# answer_cache.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+
+'''
+Disk-backed cache of Retirement Policy Explainer answers. Users ask the same few dozen CPF questions all day,
+and every fresh answer costs a validation LLM call, a schema embedding, several Neo4j round trips and two more
+LLM calls (or a Tavily search).
+
+Answers are stored in SQLite, keyed on the normalized query and a fingerprint of the knowledge graph, so the
+cache is shared by every Streamlit session and process on the machine. Entries expire after a TTL and the
+least recently used ones are evicted beyond a maximum size. Rebuilding the knowledge graph (KG_construct.py)
+clears the cache, and a changed graph schema changes every key. Hit and miss counters are kept in the same
+database to report the hit rate. The SemanticCache (semantic_cache.py) finds paraphrases of stored queries,
+whose answers are then read from here.
+'''
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "ANSWER_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "answer_cache.sqlite3"))
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600  # CPF policies change rarely, but they do change
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def normalize_query(query):
+    """Case-fold, drop punctuation that does not change the meaning and collapse whitespace."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"[^\w\s$%.]", " ", query)
+    return " ".join(query.split()).strip(". ")
+
+
+def cache_key(query, kg_version=""):
+    return hashlib.sha256(f"{kg_version}\0{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as connection:
+            # WAL lets readers in other processes carry on while one process writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    @contextmanager
+    def _connection(self):
+        # A short-lived connection per operation is safe across threads and processes
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:  # Commit on success, roll back on error
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _count(connection, name, amount=1):
+        connection.execute("INSERT INTO meta (name, value) VALUES (?, ?) "
+                           "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))
+
+    def record(self, name):
+        """Count one 'hits', 'misses' or 'semantic_hits' event."""
+        with self._connection() as connection:
+            self._count(connection, name)
+
+    def get(self, query, kg_version="", record=True):
+        """
+        Return the cached answer for `query`, or None if there is no fresh entry.
+
+        With record=False the lookup is not counted, for callers that record the overall outcome themselves.
+        """
+        key = cache_key(query, kg_version)
+        now = time.time()
+        with self._connection() as connection:
+            row = connection.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                connection.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+                if record:
+                    self._count(connection, "hits")
+                return row[0]
+            if row is not None:  # Expired
+                connection.execute("DELETE FROM answers WHERE key = ?", (key,))
+            if record:
+                self._count(connection, "misses")
+        return None
+
+    def queries(self):
+        """Return the normalized queries of all fresh entries, most recently used first."""
+        with self._connection() as connection:
+            rows = connection.execute("SELECT query FROM answers WHERE created_at >= ? ORDER BY last_used DESC",
+                                      (time.time() - self.ttl_seconds,))
+            return [row[0] for row in rows]
+
+    def put(self, query, answer, kg_version=""):
+        """Store an answer, then drop expired entries and the least recently used ones beyond max_entries."""
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO answers (key, query, answer, created_at, last_used) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (cache_key(query, kg_version), normalize_query(query), answer, now, now))
+            connection.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+            connection.execute("DELETE FROM answers WHERE key IN "
+                               "(SELECT key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                               (self.max_entries,))
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the knowledge graph has been rebuilt."""
+        with self._connection() as connection:
+            connection.execute("DELETE FROM answers")
+            connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('invalidated_at', ?)", (time.time(),))
+
+    def stats(self):
+        """
+        Return the number of entries, hits, misses and the hit rate since the cache was created.
+        Hits include 'semantic_hits', the ones served for a paraphrase of a stored query.
+        """
+        with self._connection() as connection:
+            entries = connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            counters = dict(connection.execute(
+                "SELECT name, value FROM meta WHERE name IN ('hits', 'semantic_hits', 'misses')"))
+        semantic_hits = int(counters.get("semantic_hits", 0))
+        hits, misses = int(counters.get("hits", 0)) + semantic_hits, int(counters.get("misses", 0))
+        return {
+            "entries": entries,
+            "hits": hits,
+            "semantic_hits": semantic_hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
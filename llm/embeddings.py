@@ -0,0 +1,23 @@
+# embeddings.py
+
+import threading
+
+from sentence_transformers import SentenceTransformer
+
+'''
+One shared sentence-transformer per process. SchemaUtils, the semantic answer cache and the query classifier
+all embed text with the same small model, so it is loaded once and reused instead of once per user.
+'''
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name=DEFAULT_EMBEDDING_MODEL):
+    """Return the SentenceTransformer for `model_name`, loading it on first use."""
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = SentenceTransformer(model_name)
+        return _models[model_name]
@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from langchain.agents import initialize_agent, Tool
 from langchain_community.retrievers import TavilySearchAPIRetriever
 from langchain.llms import OpenAI
+from services import service
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -30,23 +31,27 @@ if not tavily_api_key:
 if not tavily_api_key:
     raise ValueError("API key is required to proceed.")
 
-# Initialize LLM (OpenAI) using the API key
-llm = OpenAI(temperature=0, api_key=openai_api_key)
+# Initialize LLM (OpenAI) using the API key, on first use
+@service
+def get_llm():
+    return OpenAI(temperature=0, api_key=openai_api_key)
 
 from langchain_community.tools import TavilySearchResults
 
-tool = TavilySearchResults(
-    max_results=5,
-    search_depth="advanced",
-    include_answer=True,
-    include_raw_content=True,
-    include_images=False,
-    # include_domains=[...],
-    # exclude_domains=[...],
-    # name="...",            # overwrite default tool name
-    # description="...",     # overwrite default tool description
-    # args_schema=...,       # overwrite default args_schema: BaseModel
-)
+@service
+def get_search_tool():
+    return TavilySearchResults(
+        max_results=5,
+        search_depth="advanced",
+        include_answer=True,
+        include_raw_content=True,
+        include_images=False,
+        # include_domains=[...],
+        # exclude_domains=[...],
+        # name="...",            # overwrite default tool name
+        # description="...",     # overwrite default tool description
+        # args_schema=...,       # overwrite default args_schema: BaseModel
+    )
 
 def generate_prose_with_references(response):
     """Generate a prose summary from the search response with references."""
@@ -65,7 +70,7 @@ def generate_prose_with_references(response):
 def perform_search(query):
     """Perform a search using Tavily Search tool and return the response along with URLs as references."""
     # Run the query using the search agent
-    response = tool.invoke({"query": query})
+    response = get_search_tool().invoke({"query": query})
 
     response = generate_prose_with_references(response)
 
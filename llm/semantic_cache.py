@@ -0,0 +1,98 @@
+# semantic_cache.py
+
+import threading
+
+import numpy as np
+
+'''
+Semantic lookup in front of the answer cache: paraphrases such as "what happens to my SA at 55" and "special
+account closure at age 55" miss an exact-match cache, but their sentence embeddings are close.
+
+Each answered query is embedded once and stored as a unit-length row of one contiguous float32 matrix, so the
+cosine similarity to every stored query is a single matrix-vector product. The matrix grows by doubling, and
+removing an entry moves the last row into its place, so the rows in use are always a contiguous prefix.
+
+Only the keys (normalized queries) live here; the answers stay in the AnswerCache, which owns expiry and
+invalidation.
+'''
+
+DEFAULT_THRESHOLD = 0.9
+INITIAL_CAPACITY = 256
+
+
+class SemanticCache:
+    def __init__(self, dimension, threshold=DEFAULT_THRESHOLD, initial_capacity=INITIAL_CAPACITY):
+        self.dimension = dimension
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # (matrix, rows in use) are swapped together, so lookups never need the lock
+        self._state = (np.zeros((initial_capacity, dimension), dtype=np.float32), 0)
+        self._keys = []
+        self._positions = {}
+
+    def __len__(self):
+        return self._state[1]
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def add(self, key, embedding):
+        """Store (or replace) the embedding for `key`."""
+        embedding = self._normalize(embedding)
+        with self._lock:
+            matrix, size = self._state
+            position = self._positions.get(key)
+            if position is not None:
+                matrix[position] = embedding
+                return
+            if size == matrix.shape[0]:
+                grown = np.zeros((2 * matrix.shape[0], self.dimension), dtype=np.float32)
+                grown[:size] = matrix[:size]
+                matrix = grown
+            matrix[size] = embedding
+            self._keys.append(key)
+            self._positions[key] = size
+            self._state = (matrix, size + 1)
+
+    def discard(self, key):
+        """Forget `key`, e.g. once its answer has expired from the answer cache."""
+        with self._lock:
+            position = self._positions.pop(key, None)
+            if position is None:
+                return
+            matrix, size = self._state
+            last = size - 1
+            if position != last:
+                # Moving the last row into the gap keeps the rows in use contiguous
+                matrix[position] = matrix[last]
+                self._keys[position] = self._keys[last]
+                self._positions[self._keys[position]] = position
+            self._keys.pop()
+            self._state = (matrix, last)
+
+    def lookup(self, embedding, threshold=None):
+        """
+        Find the stored query most similar to `embedding`.
+
+        Returns:
+            tuple: (key, cosine similarity) of the best match, or None if nothing reaches the threshold.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        embedding = self._normalize(embedding)
+        matrix, size = self._state
+        if size == 0:
+            return None
+        similarities = matrix[:size] @ embedding
+        best = int(similarities.argmax())
+        if similarities[best] < threshold:
+            return None
+        with self._lock:
+            # A concurrent discard may have moved another entry into this row, so re-check it under the lock
+            matrix, size = self._state
+            if best >= size:
+                return None
+            similarity = float(matrix[best] @ embedding)
+            return (self._keys[best], similarity) if similarity >= threshold else None
@@ -0,0 +1,18 @@
+# verdict.py
+
+'''
+Reading the verdict of the LLM query validation (validation.py). It is kept apart from the LLM client so that
+it can be used and tested without one.
+'''
+
+# Quotes, punctuation and markdown emphasis the LLM may put around its one-word answer
+VERDICT_PUNCTUATION = "\"'`*.,:;!"
+
+
+def parse_verdict(result):
+    """
+    True only if the reply is "Valid", alone or as its first word (case and surrounding punctuation aside).
+    Anything else, including "Invalid" and replies such as "This query is not valid", counts as invalid.
+    """
+    words = result.split()
+    return bool(words) and words[0].strip(VERDICT_PUNCTUATION).casefold() == "valid"
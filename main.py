@@ -1,6 +1,7 @@
 import streamlit as st
 
 from utility import check_password
+from services import start_warm_up
 
 # Do not continue if check_password is not True.  
 if not check_password():  
@@ -26,11 +27,9 @@ def get_openai_api_key():
 
 get_openai_api_key()
 
-
-from policy_explainer import policy_explainer  # Import the policy explainer module
-from life_simulator import life_simulator  # Import the life simulator module
-from about_us import about_us
-from methodology import methodology
+# Load the explainer's models and connections in the background once per server process. Pages are imported
+# only when they are opened, so the Home page does not wait for any of it.
+start_warm_up()
 
 # Define a function for the Home page
 def home():
@@ -64,14 +63,18 @@ def main():
     if page == "Home":
         home()
     elif page == "Retirement Policy Explainer":
+        from policy_explainer import policy_explainer  # Import the policy explainer module
         policy_explainer()  # Call the function from policy_explainer.py
     elif page == "Lifestyle & Retirement Simulator":
+        from life_simulator import life_simulator  # Import the life simulator module
         life_simulator()  # Call the function from life_simulator.py
     
     elif page == "About Us":
+        from about_us import about_us
         about_us()  # Call the function from about_us.py
 
     elif page == "Methodology":
+        from methodology import methodology
         methodology()  # Call the function from about_us.py
 
 if __name__ == "__main__":
@@ -1,44 +1,225 @@
 import streamlit as st
-from llm.validation import validate_retirement_query
-from llm.search import perform_search
-from knowledge_graph.KG_query import query_kg_db
+from llm.validation import validate_retirement_query, get_query_classifier, get_llm as get_validation_llm
+from llm.search import perform_search, get_search_tool
+from llm.answer_cache import AnswerCache, normalize_query
+from llm.semantic_cache import SemanticCache, DEFAULT_THRESHOLD
+from llm.embeddings import get_embedding_model
+from retrieval.bm25 import get_corpus_index, format_corpus_answer
+from retrieval.hybrid import get_dense_index, hybrid_search
+from knowledge_graph.KG_query import (retrieve_kg_context, stream_kg_answer, get_schema_fingerprint,
+                                      get_llm as get_kg_llm)
+from knowledge_graph.neo4j_pool import get_driver, KGUnavailableError
+from services import service
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-#for deployment in streamlit cloud
-st.write(os.environ['OPENAI_API_KEY'] == st.secrets['OPENAI_API_KEY'],
-    os.environ['TAVILY_API_KEY'] == st.secrets['TAVILY_API_KEY'],
-    os.environ['NEO4J_URI'] == st.secrets['NEO4J_URI'],
-    os.environ['NEO4J_USERNAME'] == st.secrets['NEO4J_USERNAME'],
-    os.environ['NEO4J_PASSWORD'] == st.secrets['NEO4J_PASSWORD'],
-    os.environ['AURA_INSTANCEID'] == st.secrets['AURA_INSTANCEID'],
-    os.environ['AURA_INSTANCENAME'] == st.secrets['AURA_INSTANCENAME'],
-    )
+INVALID_QUERY_MESSAGE = "Your query is invalid. Please make sure it is about Singapore retirement policies and does not contain any irrelevant or harmful content."
+
+# Validation, KG lookup and web search run concurrently unless POLICY_EXPLAINER_CONCURRENT=0
+CONCURRENT_EXPLAINER = os.getenv("POLICY_EXPLAINER_CONCURRENT", "1") != "0"
+# Time the KG lookup gets before a web search (or the local corpus answer) is used instead
+KG_LATENCY_BUDGET_SECONDS = float(os.getenv("KG_LATENCY_BUDGET_SECONDS", "3"))
+# Passages from the local corpus index quoted in an answer
+CORPUS_PASSAGES = 3
+# Shared by all sessions; each query uses at most three workers
+_executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix="policy-explainer")
+
+# Answers shared across sessions and processes; keyed on the graph schema so a changed graph misses
+answer_cache = AnswerCache()
+
+
+# Paraphrase matching with the sentence-transformer SchemaUtils already loads, seeded with the stored queries
+@service
+def get_semantic_cache():
+    model = get_embedding_model()
+    semantic_cache = SemanticCache(model.get_sentence_embedding_dimension(),
+                                   threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLD)))
+    stored_queries = answer_cache.queries()
+    if stored_queries:
+        for stored_query, embedding in zip(stored_queries, model.encode(stored_queries)):
+            semantic_cache.add(stored_query, embedding)
+    return semantic_cache
+
+
+def warm_up():
+    """Build every service the explainer uses, so that the first query does not wait for them (see services.py)."""
+    get_semantic_cache()  # Loads the embedding model
+    get_query_classifier()
+    get_validation_llm()
+    get_driver()
+    get_schema_fingerprint()  # Reads the schema from Neo4j and embeds its terms
+    get_kg_llm()
+    get_search_tool()
+    get_corpus_index()
+    get_dense_index()  # Embeds any pages added to the corpus since the last run
 
 
 def retirement_policy_explainer(query):
-    """Validate the query, query KG, and if no results, perform a search using Tavily Search."""
-    
+    """
+    Validate the query, query KG, and if no results, perform a search using Tavily Search.
+    Returns the answer as a string, or as a stream of text chunks when it is generated from the KG.
+    """
+
+    # Step 0: Reuse a cached answer to the same question, or to a close paraphrase of it
+    try:
+        schema_fingerprint = get_schema_fingerprint()
+    except KGUnavailableError as e:
+        # Answer from the other sources without the cache, which is keyed on the graph schema
+        print(f"Skipping the answer cache: {str(e)}")
+        answer = _answer_query(query, get_embedding_model().encode(query))
+        return answer if answer is None or isinstance(answer, str) else _guard_stream(answer)
+
+    cached_answer = answer_cache.get(query, kg_version=schema_fingerprint, record=False)
+    if cached_answer is not None:
+        answer_cache.record("hits")
+        return cached_answer
+
+    semantic_cache = get_semantic_cache()
+    query_embedding = get_embedding_model().encode(query)
+    match = semantic_cache.lookup(query_embedding)
+    if match is not None:
+        cached_answer = answer_cache.get(match[0], kg_version=schema_fingerprint, record=False)
+        if cached_answer is not None:
+            answer_cache.record("semantic_hits")
+            return cached_answer
+        semantic_cache.discard(match[0])  # Expired or invalidated since it was stored
+    answer_cache.record("misses")
+
+    answer = _answer_query(query, query_embedding)
+    if answer is None or isinstance(answer, str):
+        # Rejections are not cached: they are cheap and may be a one-off misjudgement by the LLM
+        if answer and answer != INVALID_QUERY_MESSAGE:
+            _cache_answer(query, query_embedding, answer, schema_fingerprint)
+        return answer
+    return _guard_stream(answer, lambda text: _cache_answer(query, query_embedding, text, schema_fingerprint))
+
+
+def _cache_answer(query, query_embedding, answer, schema_fingerprint):
+    answer_cache.put(query, answer, kg_version=schema_fingerprint)
+    get_semantic_cache().add(normalize_query(query), query_embedding)
+
+
+def _guard_stream(stream, on_complete=None):
+    # Pass a streamed answer through, and hand the full text to on_complete (e.g. to cache it) once it has
+    # been generated without error
+    chunks = []
+    try:
+        for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+    except Exception as e:
+        # Part of the answer is already on the page, so report the failure there and cache nothing
+        print(f"An error occurred while generating the answer: {str(e)}")
+        yield "\n\nSorry, something went wrong while generating the answer. Please try again."
+        return
+    if on_complete is not None:
+        on_complete("".join(chunks))
+
+
+def _corpus_hits(query, query_embedding):
+    """Passages of the scraped CPF pages that answer the query, from the local hybrid index (milliseconds)."""
+    try:
+        return hybrid_search(query, query_embedding, k=CORPUS_PASSAGES)
+    except Exception as e:
+        print(f"An error occurred during the corpus search: {str(e)}")
+        return []
+
+
+def _answer_query_sequential(query, query_embedding):
     # Step 1: Show checking status
     with st.spinner("Checking query..."):
         is_valid_query = validate_retirement_query(query)
 
     if not is_valid_query:
-        return "Your query is invalid. Please make sure it is about Singapore retirement policies and does not contain any irrelevant or harmful content."
+        return INVALID_QUERY_MESSAGE
     
     elif is_valid_query:
         # Step 2: Query the Knowledge Graph
         with st.spinner("Searching our database for relevant information..."):
-            kg_response = query_kg_db(query)
+            kg_context = retrieve_kg_context(query)
 
-        if kg_response and "No valid Cypher query or relevant context found" not in kg_response:
-            # If a valid response is found from the KG, return it directly
-            return kg_response
+        if kg_context is not None:
+            # If relevant context is found in the KG, stream the answer generated from it
+            return stream_kg_answer(query, *kg_context)
+
+        # Step 3: Answer from the scraped CPF pages if they cover the query
+        corpus_hits = _corpus_hits(query, query_embedding)
+        if corpus_hits:
+            return format_corpus_answer(corpus_hits)
         else:
-            # Step 3: Fall back to Tavily Search
+            # Step 4: Fall back to Tavily Search
             with st.spinner("Database search did not yield results. Searching Online for information..."):
                 result = perform_search(query)
                 return result
 
+
+def _kg_context(kg_future):
+    """The KG context if the lookup finished and found something relevant, else None."""
+    if kg_future.cancelled() or kg_future.exception() is not None:
+        return None
+    return kg_future.result()
+
+
+def _answer_query_concurrent(query, query_embedding):
+    """
+    Run validation and the KG lookup at the same time. If the KG lookup is over its latency budget or comes
+    back empty, the passages found in the local corpus index are used, and only if there are none is the Tavily
+    search started. KG context that is ready is preferred; otherwise whichever of the KG context and the
+    fallback answer arrives first is used. Work that is no longer needed (after a
+    failed validation or an early answer) is cancelled: queued tasks do not start, and the KG lookup skips its
+    graph query.
+
+    Returns the invalid-query message, the corpus or web answer, or a stream of the answer generated from the
+    KG context.
+    """
+    stop = threading.Event()
+    validation = _executor.submit(validate_retirement_query, query)
+    kg = _executor.submit(retrieve_kg_context, query, stop)
+    corpus_hits = _corpus_hits(query, query_embedding)  # Runs while validation and the KG lookup are in flight
+    web = None
+    kg_deadline = time.monotonic() + KG_LATENCY_BUDGET_SECONDS
+
+    status = st.empty()
+    try:
+        with st.spinner("Checking query and searching our database for relevant information..."):
+            while True:
+                kg_given_up = (kg.done() and _kg_context(kg) is None) or time.monotonic() >= kg_deadline
+                if web is None and not corpus_hits and kg_given_up:
+                    web = _executor.submit(perform_search, query)
+                    status.caption("Also searching online for information...")
+
+                if validation.done():
+                    if not validation.result():
+                        return INVALID_QUERY_MESSAGE
+                    kg_context = _kg_context(kg) if kg.done() else None
+                    if kg_context is not None:
+                        # Generated in this (the script) thread, as the page reads the stream
+                        return stream_kg_answer(query, *kg_context)
+                    if corpus_hits and kg_given_up:
+                        return format_corpus_answer(corpus_hits)
+                    if web is not None and web.done():
+                        return web.result()
+
+                # Sleep until something finishes, or until the KG budget runs out if it is still running
+                pending = [future for future in (validation, kg, web) if future is not None and not future.done()]
+                remaining = kg_deadline - time.monotonic()
+                timeout = remaining if web is None and remaining > 0 else None
+                wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+    finally:
+        stop.set()
+        for future in (validation, kg, web):
+            if future is not None:
+                future.cancel()
+        status.empty()
+
+
+def _answer_query(query, query_embedding):
+    if CONCURRENT_EXPLAINER:
+        return _answer_query_concurrent(query, query_embedding)
+    return _answer_query_sequential(query, query_embedding)
+
 # Streamlit page to handle user input and query explanation
 def policy_explainer():
     st.title("Retirement Policy Explainer")
@@ -50,8 +231,17 @@ def policy_explainer():
     if st.button("Search"):
         if query:
             result = retirement_policy_explainer(query)
-            if result:
+            if isinstance(result, str):
                 st.write(result)
+            elif result is not None:
+                # Streamed answers appear token by token as the LLM generates them
+                st.write_stream(result)
+            stats = answer_cache.stats()
+            st.caption(f"Answer cache: {stats['hits']} hits ({stats['semantic_hits']} for paraphrases), "
+                       f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate, {stats['entries']} answers stored)")
+            validation = get_query_classifier().stats()
+            st.caption(f"Query validation: {validation['llm_calls_avoided']} rejected locally, "
+                       f"{validation['llm']} sent to the LLM")
         else:
             st.warning("Please enter a query.")
 
@@ -0,0 +1,175 @@
+# bm25.py
+
+import os
+import re
+
+import numpy as np
+
+from retrieval.corpus import CORPUS_FILE, INDEX_DIR, corpus_sha256, load_passages
+from services import service
+
+'''
+BM25 full-text index over the scraped CPF corpus. It is the local retrieval tier between the knowledge
+graph and the Tavily web search, so a KG miss can often be answered without leaving the machine.
+
+The index is an inverted index in CSR form: the postings of term t are
+doc_ids[indptr[t]:indptr[t + 1]], with the BM25 weight of the term in each passage precomputed in weights
+(the document-length normalisation does not depend on the query). Scoring a query is then a handful of
+scatter-adds, one per query term. The arrays and passages are saved to one .npz file keyed on the corpus
+hash, so the index is built once and later processes only load it.
+'''
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# A passage only answers a query if it contains query terms carrying at least this share of the query's IDF
+MIN_COVERAGE = 0.6
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does did for from had has have how i if in into is it its me
+my of on or our so than that the their them then there these they this to was we were what when where which
+who whom why will with would you your yours am any all also about after before more most much such
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token):
+    # Light plural folding so that "payouts" matches "payout" and "policies" matches "policy"
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [_stem(token) for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, terms, indptr, doc_ids, weights, idf, urls, texts):
+        self.terms = terms  # Sorted, so a term's id is found with searchsorted
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+        self.urls = urls
+        self.texts = texts
+        self.max_idf = float(np.log(1 + (len(texts) + 0.5) / 0.5))  # IDF of a term found nowhere
+
+    @classmethod
+    def build(cls, passages):
+        """Build the index from passages as returned by corpus.load_passages()."""
+        tokenized = [tokenize(passage['text']) for passage in passages]
+        terms = np.array(sorted({token for tokens in tokenized for token in tokens}))
+        term_ids = {term: position for position, term in enumerate(terms.tolist())}
+
+        # (term, passage, term frequency) triples, sorted by term into CSR order
+        term_column, doc_column, tf_column = [], [], []
+        for doc_id, tokens in enumerate(tokenized):
+            ids, counts = np.unique([term_ids[token] for token in tokens], return_counts=True)
+            term_column.append(ids)
+            doc_column.append(np.full(len(ids), doc_id))
+            tf_column.append(counts)
+        term_column = np.concatenate(term_column).astype(np.int32)
+        doc_column = np.concatenate(doc_column).astype(np.int32)
+        tf_column = np.concatenate(tf_column).astype(np.float32)
+        order = np.argsort(term_column, kind='stable')
+        term_column, doc_column, tf_column = term_column[order], doc_column[order], tf_column[order]
+
+        n_docs = len(passages)
+        doc_lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float32)
+        document_frequency = np.bincount(term_column, minlength=len(terms))
+        idf = np.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        length_norm = K1 * (1 - B + B * doc_lengths / max(doc_lengths.mean(), 1))
+        weights = idf[term_column] * tf_column * (K1 + 1) / (tf_column + length_norm[doc_column])
+
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=indptr[1:])
+        return cls(terms, indptr, doc_column, weights.astype(np.float32), idf,
+                   np.array([passage['url'] for passage in passages]),
+                   np.array([passage['text'] for passage in passages]))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, terms=self.terms, indptr=self.indptr, doc_ids=self.doc_ids, weights=self.weights,
+                 idf=self.idf, urls=self.urls, texts=self.texts)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['terms'], data['indptr'], data['doc_ids'], data['weights'], data['idf'],
+                       data['urls'], data['texts'])
+
+    def search(self, query, k=5, min_coverage=MIN_COVERAGE, one_per_url=True):
+        """
+        Return the top passages for `query`.
+
+        Returns:
+            list: Up to k dicts with 'url', 'content', 'score' and 'coverage' (share of the query's IDF found in
+            the passage), best first. Passages below min_coverage are left out.
+        """
+        query_terms = np.unique(np.array(tokenize(query)))
+        if query_terms.size == 0:
+            return []
+        positions = np.searchsorted(self.terms, query_terms)
+        positions = np.minimum(positions, len(self.terms) - 1)
+        known = self.terms[positions] == query_terms
+        term_ids = positions[known]
+        query_idf = self.idf[term_ids].sum() + self.max_idf * np.count_nonzero(~known)
+
+        scores = np.zeros(len(self.texts), dtype=np.float32)
+        matched_idf = np.zeros(len(self.texts), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+            matched_idf[self.doc_ids[start:end]] += self.idf[term_id]
+        coverage = matched_idf / query_idf
+
+        candidates = np.flatnonzero(coverage >= min_coverage)
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        hits, seen_urls = [], set()
+        for doc_id in candidates:
+            url = str(self.urls[doc_id])
+            if one_per_url and url in seen_urls:
+                continue
+            seen_urls.add(url)
+            hits.append({'url': url, 'content': str(self.texts[doc_id]), 'score': float(scores[doc_id]),
+                         'coverage': float(coverage[doc_id])})
+            if len(hits) == k:
+                break
+        return hits
+
+
+def load_or_build_index(corpus_path=CORPUS_FILE, index_dir=INDEX_DIR):
+    """Load the persisted index for the current corpus, building and saving it first if needed."""
+    path = os.path.join(index_dir, f"bm25-{corpus_sha256(corpus_path)[:16]}.npz")
+    if os.path.exists(path):
+        try:
+            return BM25Index.load(path)
+        except Exception as e:
+            print(f"Could not read BM25 index {path}, rebuilding it. Error: {e}")
+
+    index = BM25Index.build(load_passages(corpus_path))
+    # The saved index is only an optimisation, so failing to write it must not break the page
+    try:
+        index.save(path)
+    except Exception as e:
+        print(f"Could not write BM25 index {path}. Error: {e}")
+    return index
+
+
+@service
+def get_corpus_index():
+    return load_or_build_index()
+
+
+def format_corpus_answer(hits):
+    """Format passages as an answer with numbered references, like the web search answers."""
+    passages = " ".join(f"{hit['content']} [{number}]" for number, hit in enumerate(hits, start=1))
+    references = "\n".join(f"- [{number}] {hit['url']}" for number, hit in enumerate(hits, start=1))
+    return f"Here is what I found on the CPF website: {passages}\n\nReferences:\n{references}"
@@ -0,0 +1,79 @@
+# corpus.py
+
+import hashlib
+import json
+import os
+import re
+
+'''
+The scraped CPF pages (combined_text_output.json) as retrievable passages. Each page is the CPF website's
+navigation menus around one FAQ, so only the question and the article body are kept, and the body is split
+into overlapping passages of a few sentences. Every passage is prefixed with its page's question, which is
+the most informative text for matching.
+'''
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_FILE = os.path.join(PROJECT_DIR, "combined_text_output.json")
+INDEX_DIR = os.path.join(PROJECT_DIR, ".cache")
+
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP_WORDS = 30
+
+# Markers around the article body on the scraped pages
+_QUESTION = re.compile(r"\s*CPFB \| (.+?) Login\b")
+_BODY_START = "Facebook Facebook Telegram WhatsApp Email LinkedIn Twitter "
+_BODY_END = "Was this article helpful?"
+
+
+def corpus_sha256(corpus_path=CORPUS_FILE):
+    sha256 = hashlib.sha256()
+    with open(corpus_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def extract_article(content):
+    """Return (question, body) of a scraped page, without the navigation menus and footer."""
+    match = _QUESTION.match(content)
+    question = match.group(1).strip() if match else ""
+    start = content.find(_BODY_START)
+    body = content[start + len(_BODY_START):] if start >= 0 else content
+    end = body.find(_BODY_END)
+    body = body[:end] if end >= 0 else body
+    # The body repeats the question as its heading
+    if question and body.startswith(question):
+        body = body[len(question):]
+    return question, body.strip()
+
+
+def split_passages(text, words=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP_WORDS):
+    """Split text into windows of about `words` words that overlap by `overlap` words."""
+    tokens = text.split()
+    if len(tokens) <= words:
+        return [" ".join(tokens)] if tokens else []
+    step = words - overlap
+    return [" ".join(tokens[start:start + words]) for start in range(0, len(tokens) - overlap, step)]
+
+
+def page_passages(url, content):
+    """The passages of one scraped page, as dicts with 'url', 'question' and 'text' (question followed by passage)."""
+    question, body = extract_article(content)
+    return [{'url': url, 'question': question, 'text': f"{question} {passage}".strip()}
+            for passage in split_passages(body) or [""]]
+
+
+def load_pages(corpus_path=CORPUS_FILE):
+    """The scraped pages as (url, content) pairs, in corpus order."""
+    with open(corpus_path, "r", encoding="utf-8") as file:
+        return [(page['URL'], page['Content']) for page in json.load(file)]
+
+
+def load_passages(corpus_path=CORPUS_FILE):
+    """
+    Load the corpus as passages.
+
+    Returns:
+        list: One dict per passage with 'url', 'question' and 'text' (the question followed by the passage).
+    """
+    return [passage for url, content in load_pages(corpus_path) for passage in page_passages(url, content)]
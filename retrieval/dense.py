@@ -0,0 +1,229 @@
+# dense.py
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from retrieval.corpus import CORPUS_FILE, INDEX_DIR, load_pages, page_passages
+
+'''
+Dense passage index over the scraped CPF corpus: every passage from corpus.py embedded with the same
+sentence-transformer the rest of the app uses, so paraphrases that share no keywords with the page still
+match.
+
+On disk (.cache/dense-<model>/), the index is
+- vectors-<digest>.npy: the normalised passage embeddings as a float16 matrix, memory-mapped read-only,
+- ivf-<digest>.npz: for large corpora only, an inverted-file index (k-means centroids and, per centroid, the
+  rows assigned to it, in CSR form) so that a query scores a few lists instead of every row,
+- manifest.json: the current vectors file and, per URL, a hash of its passages, its rows and their texts.
+
+Building is incremental per URL: pages whose passages are unchanged keep their rows, and only new or edited
+pages are embedded. The manifest is replaced last, so a reader never sees a half-written index.
+'''
+
+EMBED_BATCH_SIZE = 64
+# Corpora smaller than this are scored exhaustively. Converting float16 rows for scoring costs about 1 ms per
+# 1,000 rows on CPU, so larger ones get an IVF index to stay within a few milliseconds
+IVF_MIN_ROWS = 4096
+IVF_PROBES = 8
+KMEANS_ITERATIONS = 10
+# Rows scored per step of an exhaustive search, to bound the float32 copy of the float16 matrix
+SCORE_BLOCK_ROWS = 32768
+
+
+def _page_digest(texts, model_name):
+    return hashlib.sha256("\n".join([model_name] + texts).encode("utf-8")).hexdigest()
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means (cosine similarity) on normalised float32 rows. Returns the normalised centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=clusters) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), np.count_nonzero(empty), replace=False)]
+        centroids = _normalise(sums)
+    return centroids
+
+
+def build_ivf(vectors):
+    """Cluster the rows into about sqrt(rows) lists. Returns (centroids, indptr, rows) with rows grouped by list."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    clusters = int(np.sqrt(len(vectors)))
+    centroids = kmeans(vectors, clusters)
+    assignment = np.argmax(vectors @ centroids.T, axis=1)
+    rows = np.argsort(assignment, kind='stable').astype(np.int32)
+    indptr = np.zeros(clusters + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=clusters), out=indptr[1:])
+    return centroids.astype(np.float32), indptr, rows
+
+
+class DenseIndex:
+    def __init__(self, vectors, urls, texts, ivf=None):
+        self.vectors = vectors  # float16, usually a read-only memmap
+        self.urls = urls
+        self.texts = texts
+        self.ivf = ivf
+
+    def _candidate_rows(self, query_vector, probes):
+        centroids, indptr, rows = self.ivf
+        lists = np.argpartition(-(centroids @ query_vector), min(probes, len(centroids)) - 1)[:probes]
+        return np.concatenate([rows[indptr[i]:indptr[i + 1]] for i in lists])
+
+    def scores(self, query_vector, probes=IVF_PROBES):
+        """Cosine similarity of `query_vector` with the rows it is compared to. Returns (rows, similarities)."""
+        query_vector = _normalise(query_vector).ravel()
+        if self.ivf is not None:
+            rows = np.sort(self._candidate_rows(query_vector, probes))
+            return rows, self.vectors[rows].astype(np.float32) @ query_vector
+        similarities = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS]
+            similarities[start:start + len(block)] = block.astype(np.float32) @ query_vector
+        return np.arange(len(self.vectors)), similarities
+
+    def search(self, query_vector, k=5, min_similarity=0.0, probes=IVF_PROBES, one_per_url=True):
+        """
+        Return the passages closest to an embedded query.
+
+        Returns:
+            list: Up to k dicts with 'url', 'content' and 'similarity', best first.
+        """
+        if len(self.texts) == 0:
+            return []
+        rows, similarities = self.scores(query_vector, probes)
+        # Over-fetch so that dropping repeated URLs still leaves k passages
+        top = min(len(rows), k * 4)
+        best = np.argpartition(-similarities, top - 1)[:top]
+        best = best[np.argsort(-similarities[best], kind='stable')]
+        hits, seen_urls = [], set()
+        for position in best:
+            if similarities[position] < min_similarity:
+                break
+            row = rows[position]
+            url = self.urls[row]
+            if one_per_url and url in seen_urls:
+                continue
+            seen_urls.add(url)
+            hits.append({'url': url, 'content': self.texts[row], 'similarity': float(similarities[position])})
+            if len(hits) == k:
+                break
+        return hits
+
+
+def _index_dir(model_name, index_dir):
+    return os.path.join(index_dir, f"dense-{model_name.replace('/', '_')}")
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def load_dense_index(model_name, index_dir=INDEX_DIR):
+    """The index as last built for `model_name`, or None if it has not been built."""
+    directory = _index_dir(model_name, index_dir)
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        return None
+    vectors = np.load(os.path.join(directory, manifest['vectors']), mmap_mode='r')
+    urls, texts = [], []
+    for page in manifest['pages']:
+        urls.extend([page['url']] * len(page['texts']))
+        texts.extend(page['texts'])
+    ivf = None
+    if manifest.get('ivf'):
+        with np.load(os.path.join(directory, manifest['ivf'])) as data:
+            ivf = (data['centroids'], data['indptr'], data['rows'])
+    return DenseIndex(vectors, urls, texts, ivf)
+
+
+def update_dense_index(encoder, model_name, corpus_path=CORPUS_FILE, index_dir=INDEX_DIR):
+    """
+    Bring the on-disk index up to date with the corpus, embedding only new or changed pages.
+
+    Returns:
+        tuple: (DenseIndex, number of pages embedded).
+    """
+    directory = _index_dir(model_name, index_dir)
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_manifest(directory)
+    previous_pages = {page['url']: page for page in previous['pages']} if previous else {}
+    previous_vectors = np.load(os.path.join(directory, previous['vectors']), mmap_mode='r') if previous else None
+
+    pages, to_embed = [], []
+    for url, content in load_pages(corpus_path):
+        texts = [passage['text'] for passage in page_passages(url, content)]
+        digest = _page_digest(texts, model_name)
+        old = previous_pages.get(url)
+        reuse = old is not None and old['sha256'] == digest
+        pages.append({'url': url, 'sha256': digest, 'texts': texts, 'reuse_start': old['start'] if reuse else None})
+        if not reuse:
+            to_embed.extend(texts)
+
+    if previous is not None and not to_embed and len(pages) == len(previous['pages']):
+        return load_dense_index(model_name, index_dir), 0
+
+    embedded = _normalise(encoder.encode(to_embed, batch_size=EMBED_BATCH_SIZE)) if to_embed else None
+    dimension = embedded.shape[1] if embedded is not None else previous_vectors.shape[1]
+    total_rows = sum(len(page['texts']) for page in pages)
+
+    # Write the new matrix page by page, copying unchanged rows from the old one
+    version = hashlib.sha256("".join(page['sha256'] for page in pages).encode("utf-8")).hexdigest()[:16]
+    vectors_name = f"vectors-{version}.npy"
+    temporary = os.path.join(directory, f"{vectors_name}.{os.getpid()}.tmp")
+    vectors = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.float16, shape=(total_rows, dimension))
+    row, embedded_row = 0, 0
+    for page in pages:
+        count = len(page['texts'])
+        if page['reuse_start'] is not None:
+            vectors[row:row + count] = previous_vectors[page['reuse_start']:page['reuse_start'] + count]
+        else:
+            vectors[row:row + count] = embedded[embedded_row:embedded_row + count]
+            embedded_row += count
+        page['start'] = row
+        del page['reuse_start']
+        row += count
+    vectors.flush()
+    del vectors
+    os.replace(temporary, os.path.join(directory, vectors_name))
+
+    ivf_name = None
+    if total_rows >= IVF_MIN_ROWS:
+        centroids, indptr, rows = build_ivf(np.load(os.path.join(directory, vectors_name), mmap_mode='r'))
+        ivf_name = f"ivf-{version}.npz"
+        temporary = os.path.join(directory, f"{ivf_name}.{os.getpid()}.tmp.npz")
+        np.savez(temporary, centroids=centroids, indptr=indptr, rows=rows)
+        os.replace(temporary, os.path.join(directory, ivf_name))
+
+    manifest = {'model': model_name, 'vectors': vectors_name, 'ivf': ivf_name, 'pages': pages}
+    temporary = os.path.join(directory, f"manifest.json.{os.getpid()}.tmp")
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(temporary, os.path.join(directory, "manifest.json"))
+
+    # Files of older versions are no longer referenced (readers that mapped them keep their handles on Linux)
+    for name in os.listdir(directory):
+        if name.startswith(("vectors-", "ivf-")) and name not in (vectors_name, ivf_name) and ".tmp" not in name:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    embedded_pages = sum(1 for page in pages if page['url'] not in previous_pages
+                         or previous_pages[page['url']]['sha256'] != page['sha256'])
+    return load_dense_index(model_name, index_dir), embedded_pages
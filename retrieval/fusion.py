@@ -0,0 +1,27 @@
+# fusion.py
+
+'''
+Reciprocal rank fusion of ranked hit lists, used by the hybrid search (hybrid.py) to merge the keyword and
+dense rankings. It only looks at ranks, so it needs no calibration between the scores of the two indexes.
+'''
+
+# Reciprocal rank fusion constant; larger values flatten the difference between ranks
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, k=5, rrf_k=RRF_K):
+    """
+    Merge ranked hit lists (dicts with a 'url'), one passage per URL.
+
+    Returns:
+        list: Up to k hits, each the best-ranked passage of its URL, with its fused 'rrf_score', best first.
+    """
+    scores, best = {}, {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            url = hit['url']
+            scores[url] = scores.get(url, 0.0) + 1.0 / (rrf_k + rank + 1)
+            if url not in best or rank < best[url][0]:
+                best[url] = (rank, hit)
+    ordered = sorted(scores, key=lambda url: -scores[url])[:k]
+    return [dict(best[url][1], rrf_score=scores[url]) for url in ordered]
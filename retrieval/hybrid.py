@@ -0,0 +1,34 @@
+# hybrid.py
+
+from llm.embeddings import get_embedding_model, DEFAULT_EMBEDDING_MODEL
+from retrieval.bm25 import MIN_COVERAGE, get_corpus_index
+from retrieval.dense import update_dense_index
+from retrieval.fusion import reciprocal_rank_fusion
+from services import service
+
+'''
+Hybrid (keyword + dense) search over the scraped CPF corpus. The BM25 index finds passages that share the
+query's rare terms; the dense index finds paraphrases. Each ranking keeps only its confident hits (enough of
+the query's IDF covered, or a high enough cosine similarity), and the two are merged with reciprocal rank
+fusion, which needs no score calibration between them.
+'''
+
+# Cosine similarity at which a passage is taken to answer the query on meaning alone
+DENSE_MIN_SIMILARITY = 0.6
+
+
+@service
+def get_dense_index():
+    index, embedded_pages = update_dense_index(get_embedding_model(DEFAULT_EMBEDDING_MODEL), DEFAULT_EMBEDDING_MODEL)
+    if embedded_pages:
+        print(f"Embedded {embedded_pages} new or changed pages into the dense passage index")
+    return index
+
+
+def hybrid_search(query, query_embedding=None, k=5, min_coverage=MIN_COVERAGE, min_similarity=DENSE_MIN_SIMILARITY):
+    """Top passages for the query from both indexes. Pass the query's embedding if it has already been computed."""
+    keyword_hits = get_corpus_index().search(query, k=k * 2, min_coverage=min_coverage)
+    if query_embedding is None:
+        query_embedding = get_embedding_model(DEFAULT_EMBEDDING_MODEL).encode(query)
+    dense_hits = get_dense_index().search(query_embedding, k=k * 2, min_similarity=min_similarity)
+    return reciprocal_rank_fusion([keyword_hits, dense_hits], k=k)
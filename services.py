@@ -0,0 +1,67 @@
+# services.py
+
+import functools
+import importlib
+import os
+import threading
+import time
+
+'''
+Process-wide registry of expensive shared resources (LLM clients, the embedding model, Neo4j connections,
+schema embeddings, caches). Each resource is declared with the @service decorator on a function that builds
+it; the function then returns the same instance for the life of the process, building it on first use under
+a lock so concurrent Streamlit sessions never build it twice.
+
+Nothing is built at import time, so pages that do not need a resource (Home, About Us) start instantly.
+start_warm_up() builds the Policy Explainer's resources in a background thread when the server starts, so
+the first query does not pay for model loading either.
+'''
+
+# Modules whose warm_up() functions build their services in the background at server start
+WARM_UP_MODULES = ("policy_explainer",)
+
+_instances = {}
+build_seconds = {}
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+def service(factory):
+    """Decorator turning `factory` into a getter for a lazily built, process-wide instance."""
+    name = f"{factory.__module__}.{factory.__qualname__}"
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get():
+        if name not in _instances:
+            with lock:
+                if name not in _instances:  # Another thread may have built it while we waited
+                    start = time.perf_counter()
+                    _instances[name] = factory()
+                    build_seconds[name] = time.perf_counter() - start
+        return _instances[name]
+
+    return get
+
+
+def _warm_up(modules):
+    for module_name in modules:
+        try:
+            start = time.perf_counter()
+            importlib.import_module(module_name).warm_up()
+            print(f"Warmed up {module_name} in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            # Services that failed here are built (and report their error) on first use instead
+            print(f"Could not warm up {module_name}. Error: {e}")
+
+
+def start_warm_up(modules=WARM_UP_MODULES):
+    """Build the given modules' services in a daemon thread, once per process. Disable with WARM_UP_SERVICES=0."""
+    global _warm_up_started
+    if os.getenv("WARM_UP_SERVICES", "1") == "0":
+        return
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=_warm_up, args=(modules,), name="service-warm-up", daemon=True).start()
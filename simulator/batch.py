@@ -0,0 +1,171 @@
+# batch.py
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from simulator.projection import project_retirement, PROFILE_FIELDS
+from simulator.expenditure import get_expenditure_index, compare_spending, SIMULATOR_CATEGORIES
+
+'''
+Headless batch run of the Life Simulator over a file of customer profiles:
+
+    python -m life_simulator batch profiles.csv -o results.parquet
+
+The CSV needs one column per field in PROFILE_FIELDS (same names and units as the Life Simulator page).
+Spending columns named after SIMULATOR_CATEGORIES are optional and default to 0, and any other column (such
+as a customer ID) is copied to the output unchanged.
+
+Profiles are streamed in chunks and scored on a process pool. At most a few chunks are in flight at a time,
+so memory stays bounded however large the input file is. Results are written in input order to Parquet or
+CSV, depending on the output file extension.
+'''
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Expenditure index shared by all chunks handled in a worker process
+_worker_index = None
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def passthrough_columns(columns):
+    """The input columns copied to the output unchanged: everything but the profile fields and spending."""
+    return [column for column in columns if column not in PROFILE_FIELDS and column not in SIMULATOR_CATEGORIES]
+
+
+def score_profiles(profiles, index=None):
+    """
+    Run the sustainability check and expenditure comparison for a DataFrame of profiles.
+
+    Returns:
+        pd.DataFrame: One row per profile with the pass-through columns, the sustainability figures and,
+        for each category in the survey, the closest income quintile (1-5) and comparable income percentile.
+    """
+    if index is None:
+        index = _worker_index if _worker_index is not None else get_expenditure_index()
+
+    results = profiles[passthrough_columns(profiles.columns)].reset_index(drop=True)
+
+    projection = project_retirement(profiles, with_path=False)
+    results['total_savings_at_retirement'] = projection['total_savings_at_retirement']
+    results['total_post_retirement_expenses'] = projection['total_post_retirement_expenses']
+    results['depletion_age'] = projection['depletion_age']
+    results['sustainable'] = projection['sustainable']
+
+    spending = profiles.reindex(columns=list(SIMULATOR_CATEGORIES), fill_value=0).to_numpy(dtype=float)
+    comparison = compare_spending(spending, index)
+    for position, category in enumerate(SIMULATOR_CATEGORIES):
+        closest_quintile = comparison['closest_quintile'][:, position]
+        if closest_quintile[0] < 0:  # Category is not in the survey
+            continue
+        results[f'{category}_closest_quintile'] = (closest_quintile + 1).astype(np.int8)
+        results[f'{category}_income_percentile'] = comparison['income_percentile'][:, position]
+
+    return results
+
+
+class _ResultWriter:
+    """Append result chunks to a Parquet or CSV file."""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.parquet = output_path.lower().endswith('.parquet')
+        self.writer = None
+        self.rows = 0
+
+    def write(self, results):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self.writer is None:
+                # Every chunk must match the file's schema. Pass-through columns are read as text, but one that
+                # is empty throughout the first chunk has no type yet, so it is declared a string column
+                schema = pa.Table.from_pandas(results, preserve_index=False).schema
+                for position, field in enumerate(schema):
+                    if pa.types.is_null(field.type):
+                        schema = schema.set(position, field.with_type(pa.string()))
+                self.writer = pq.ParquetWriter(self.output_path, schema)
+            self.writer.write_table(pa.Table.from_pandas(results, schema=self.writer.schema, preserve_index=False))
+        else:
+            results.to_csv(self.output_path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        self.rows += len(results)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def run_batch(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Score every profile in `input_path` and write the results to `output_path`.
+
+    Returns:
+        dict: Throughput statistics (profiles, chunks, seconds, profiles_per_second, workers).
+    """
+    workers = workers or os.cpu_count() or 1
+    # The index is tiny, so it is built once here and shipped to the workers instead of each re-reading the survey
+    index = get_expenditure_index()
+
+    start = time.perf_counter()
+    writer = _ResultWriter(output_path)
+    chunks = 0
+    pending = deque()
+    progress = tqdm(desc="Scoring profiles", unit=" profiles")
+
+    def collect(future):
+        results = future.result()
+        writer.write(results)
+        progress.update(len(results))
+
+    # Pass-through columns are read as text, so that their type cannot change from one chunk to the next
+    text_columns = {column: str for column in passthrough_columns(pd.read_csv(input_path, nrows=0).columns)}
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index,)) as pool:
+            for chunk in pd.read_csv(input_path, chunksize=chunk_size, dtype=text_columns):
+                pending.append(pool.submit(score_profiles, chunk))
+                chunks += 1
+                # Keep a bounded number of chunks in flight and write results in input order
+                if len(pending) >= 2 * workers:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+    finally:
+        writer.close()
+        progress.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        'profiles': writer.rows,
+        'chunks': chunks,
+        'seconds': seconds,
+        'profiles_per_second': writer.rows / seconds if seconds else float('inf'),
+        'workers': workers,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m life_simulator batch",
+                                     description="Run the Life Simulator over a CSV file of profiles.")
+    parser.add_argument("input", help="CSV file with one profile per row")
+    parser.add_argument("-o", "--output", help="Output .parquet or .csv file (default: <input>_results.parquet)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Profiles per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}_results.parquet"
+    stats = run_batch(args.input, output, chunk_size=args.chunk_size, workers=args.workers)
+    print(f"Scored {stats['profiles']:,} profiles in {stats['chunks']} chunks with {stats['workers']} workers "
+          f"in {stats['seconds']:.2f}s ({stats['profiles_per_second']:,.0f} profiles/s). Results written to {output}")
+    return stats
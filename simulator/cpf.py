@@ -0,0 +1,190 @@
+# cpf.py
+
+import numpy as np
+
+'''
+Monthly CPF account engine: Ordinary (OA), Special (SA), MediSave (MA) and Retirement (RA) Account balances
+are stepped month by month for a whole batch of profiles at once.
+
+Balances live in a structured NumPy array (one record of four float64 accounts per profile) and are updated
+through a plain (profiles x 4) float view of it. Contribution rates, account allocation and interest rates
+are looked up from tables indexed by age in whole years, so each monthly step is a handful of array
+operations with no per-profile branching.
+
+The tables follow the CPF rates published for 2025. They are a planning approximation, not an exact replica
+of CPF's rules: CPF LIFE payouts, housing withdrawals and top-ups are not modelled.
+'''
+
+ACCOUNTS = ('oa', 'sa', 'ma', 'ra')
+ACCOUNT_DTYPE = np.dtype([(account, np.float64) for account in ACCOUNTS])
+OA, SA, MA, RA = range(len(ACCOUNTS))
+
+MAX_AGE = 120
+
+# Monthly Ordinary Wage ceiling on which CPF contributions are paid
+ORDINARY_WAGE_CEILING = 7_400
+
+# Full Retirement Sum set aside in the RA at 55, and the Basic Healthcare Sum cap on the MA
+FULL_RETIREMENT_SUM = 213_000
+BASIC_HEALTHCARE_SUM = 75_500
+
+# Allocation of wages to (OA, SA, MA, RA) in percent, by the (exclusive) upper age of each band.
+# The total of the youngest band (37%) is the default contribution rate on the Life Simulator page.
+ALLOCATION_BANDS = (
+    (35, (23.0, 6.0, 8.0, 0.0)),
+    (45, (21.0, 7.0, 9.0, 0.0)),
+    (50, (19.0, 8.0, 10.0, 0.0)),
+    (55, (15.0, 11.5, 10.5, 0.0)),
+    (60, (11.5, 0.0, 10.5, 10.5)),
+    (65, (3.5, 0.0, 10.5, 9.5)),
+    (70, (1.0, 0.0, 10.5, 5.0)),
+    (MAX_AGE + 1, (1.0, 0.0, 10.5, 1.0)),
+)
+BASE_CONTRIBUTION_RATE = sum(ALLOCATION_BANDS[0][1])
+
+# Yearly base interest per account (OA, SA, MA, RA)
+BASE_INTEREST = np.array([0.025, 0.04, 0.04, 0.04])
+
+# Extra interest on the first $60,000 of combined balances (of which at most $20,000 from the OA), by tier of
+# $0-30,000 and $30,000-60,000. Row 0 is below 55 (1% on both tiers), row 1 is 55 and above (2% then 1%).
+EXTRA_INTEREST_OA_CAP = 20_000
+EXTRA_INTEREST_TIER_LIMITS = np.array([30_000, 60_000])
+EXTRA_INTEREST_BY_GROUP = np.array([[0.01, 0.01], [0.02, 0.01]])
+
+
+def _build_allocation_table():
+    """Allocation of wages to (OA, SA, MA, RA) as fractions, indexed by age in whole years."""
+    band_limits = np.array([limit for limit, _ in ALLOCATION_BANDS])
+    band_allocation = np.array([allocation for _, allocation in ALLOCATION_BANDS]) / 100
+    # CPF's "above 35 to 45" bands apply from the birthday at the lower limit, so age 35 falls in the second band
+    return band_allocation[np.searchsorted(band_limits, np.arange(MAX_AGE + 1), side='right')]
+
+
+ALLOCATION_BY_AGE = _build_allocation_table()
+
+
+def _transfer_at_55(balances):
+    """Set aside SA then OA savings in the RA up to the Full Retirement Sum and close the SA into the OA."""
+    room = np.maximum(FULL_RETIREMENT_SUM - balances[:, RA], 0)
+    from_sa = np.minimum(balances[:, SA], room)
+    from_oa = np.minimum(balances[:, OA], room - from_sa)
+    balances[:, RA] += from_sa + from_oa
+    balances[:, OA] += balances[:, SA] - from_sa - from_oa
+    balances[:, SA] = 0
+
+
+def _cap_medisave(balances, to_sa, to_ra):
+    """Move MA savings above the Basic Healthcare Sum to the SA (below 55) or RA (55 and above)."""
+    overflow = np.maximum(balances[:, MA] - BASIC_HEALTHCARE_SUM, 0)
+    balances[:, MA] -= overflow
+    balances[:, SA] += overflow * to_sa
+    balances[:, RA] += overflow * to_ra
+
+
+def project_cpf_accounts(age, income, current_cpf_savings, retirement_age, cpf_contribution_rate=BASE_CONTRIBUTION_RATE):
+    """
+    Step CPF account balances monthly from the current age until retirement.
+
+    Args:
+        age, income, current_cpf_savings, retirement_age: Arrays (or scalars) with one entry per profile, in
+            the units of the Life Simulator page (annual income, ages in years).
+        cpf_contribution_rate (float or array): Contribution rate in percent. The age-banded rates are scaled
+            by cpf_contribution_rate / 37, so the page default reproduces the published rates.
+
+    Returns:
+        dict: 'at_retirement', a structured array of account balances per profile at retirement, and 'yearly',
+        a structured (profiles x years + 1) array of balances at each birthday from the current age.
+        Profiles stop contributing and earning interest at their retirement age.
+    """
+    age, income, current_cpf_savings, retirement_age, cpf_contribution_rate = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(value, dtype=float)) for value in
+          (age, income, current_cpf_savings, retirement_age, cpf_contribution_rate)])
+    n = age.shape[0]
+    start_age = np.clip(np.floor(age), 0, MAX_AGE).astype(int)
+    months_saving = np.maximum(np.round((retirement_age - age) * 12), 0).astype(int)
+    years = int(np.ceil(months_saving.max() / 12)) if n else 0
+
+    # Profiles are processed longest-saving first, so the ones still saving in any month are a prefix
+    # of the arrays and every update works on a slice instead of a mask
+    order = np.argsort(-months_saving, kind='stable')
+    start_age, months_saving = start_age[order], months_saving[order]
+    still_saving = -months_saving  # Ascending, for searchsorted
+
+    # Structured storage with a (profiles x accounts) float view for the arithmetic
+    accounts = np.zeros(n, dtype=ACCOUNT_DTYPE)
+    balances = accounts.view(np.float64).reshape(n, len(ACCOUNTS))
+    accrued_interest = np.zeros_like(balances)
+    yearly = np.zeros((n, years + 1), dtype=ACCOUNT_DTYPE)
+
+    # Existing savings are split like the contributions at the current age
+    allocation = ALLOCATION_BY_AGE[start_age]
+    balances[:] = current_cpf_savings[order, None] * allocation / allocation.sum(axis=1, keepdims=True)
+    yearly[:, 0] = accounts
+
+    monthly_wage = (np.minimum(income / 12, ORDINARY_WAGE_CEILING)
+                    * (cpf_contribution_rate / BASE_CONTRIBUTION_RATE))[order]
+    monthly_base_interest = BASE_INTEREST / 12
+
+    for year in range(years):
+        active = np.searchsorted(still_saving, -year * 12, side='left')
+        # Steps start on a birthday, so age and therefore every table lookup is fixed for the whole year
+        current_age = np.minimum(start_age[:active] + year, MAX_AGE)
+        aged_55 = current_age >= 55
+        to_sa, to_ra = (~aged_55).astype(float), aged_55.astype(float)
+        monthly_contributions = monthly_wage[:active, None] * ALLOCATION_BY_AGE[current_age]
+        extra_interest_55 = EXTRA_INTEREST_BY_GROUP[aged_55.astype(int)] / 12
+
+        # SA closure and RA creation on the 55th birthday
+        turning_55 = np.flatnonzero((current_age == 55) & (start_age[:active] < 55))
+        if turning_55.size:
+            transferred = balances[turning_55]
+            _transfer_at_55(transferred)
+            balances[turning_55] = transferred
+
+        for month in range(year * 12, year * 12 + 12):
+            saving = np.searchsorted(still_saving, -month, side='left')
+            current = balances[:saving]
+            current += monthly_contributions[:saving]
+            _cap_medisave(current, to_sa[:saving], to_ra[:saving])
+
+            # Interest is computed monthly and credited at the end of each year. Extra interest on the first
+            # tiers of combined balances goes to the SA (below 55) or RA (55 and above).
+            accrued_interest[:saving] += current * monthly_base_interest
+            eligible = np.minimum(current[:, OA], EXTRA_INTEREST_OA_CAP) + current[:, SA:].sum(axis=1)
+            tier_amounts = np.diff(np.minimum(eligible[:, None], EXTRA_INTEREST_TIER_LIMITS), prepend=0, axis=1)
+            extra_interest = (tier_amounts * extra_interest_55[:saving]).sum(axis=1)
+            accrued_interest[:saving, SA] += extra_interest * to_sa[:saving]
+            accrued_interest[:saving, RA] += extra_interest * to_ra[:saving]
+
+        # Credit the year's interest for everyone who saved the full year
+        saved_full_year = np.searchsorted(still_saving, -(year * 12 + 12), side='right')
+        balances[:saved_full_year] += accrued_interest[:saved_full_year]
+        accrued_interest[:saved_full_year] = 0
+        _cap_medisave(balances[:saved_full_year], to_sa[:saved_full_year], to_ra[:saved_full_year])
+        yearly[:, year + 1] = accounts
+
+    # Interest accrued in a final part-year is credited at retirement, and capped like the yearly credit
+    balances += accrued_interest
+    part_year = np.flatnonzero(months_saving % 12 != 0)
+    if part_year.size:
+        aged_55 = start_age[part_year] + months_saving[part_year] // 12 >= 55
+        credited = balances[part_year]
+        _cap_medisave(credited, (~aged_55).astype(float), aged_55.astype(float))
+        balances[part_year] = credited
+
+    # After retirement the balances stay at their retirement value
+    retired_after = np.ceil(months_saving / 12).astype(int)
+    after_retirement = np.arange(years + 1)[None, :] >= retired_after[:, None]
+    yearly[after_retirement] = np.broadcast_to(accounts[:, None], yearly.shape)[after_retirement]
+
+    # Back to the caller's order
+    at_retirement = np.empty_like(accounts)
+    at_retirement[order] = accounts
+    yearly_in_order = np.empty_like(yearly)
+    yearly_in_order[order] = yearly
+    return {'at_retirement': at_retirement, 'yearly': yearly_in_order}
+
+
+def retirement_savings(accounts):
+    """CPF savings available to fund retirement expenses (OA + SA + RA; MediSave is kept for healthcare)."""
+    return accounts['oa'] + accounts['sa'] + accounts['ra']
@@ -0,0 +1,244 @@
+# expenditure.py
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+'''
+Cached access to the Singstat Household Expenditure Survey 2017/18 table used by the Life Simulator.
+
+Parsing the workbook with openpyxl dominates the page latency, yet Streamlit reruns the page on every widget
+change. The cleaned table is therefore parsed at most once per process and also written to a Parquet snapshot
+named after the workbook's SHA-256 (in .cache/ next to the workbook), so new processes reuse it until the workbook itself changes.
+The cached frame is shared between sessions and its numeric values are read-only; callers get their own copy of
+it, which takes microseconds for a table of this size.
+'''
+
+EXPENDITURE_FILE = 'Singstat2018ExpenditureData.xlsx'
+SNAPSHOT_DIR = '.cache'
+
+QUINTILE_COLUMNS = ['Income_Quintile_1', 'Income_Quintile_2', 'Income_Quintile_3', 'Income_Quintile_4',
+                    'Income_Quintile_5']
+EXPENDITURE_COLUMNS = ['Total'] + QUINTILE_COLUMNS
+
+# Cleaned frames keyed by (path, modification time, size) so unchanged files are never re-hashed
+_loaded = {}
+_lock = threading.Lock()
+
+
+def parse_expenditure_workbook(file_path=EXPENDITURE_FILE):
+    """Read and clean the expenditure workbook (slow, goes through openpyxl)."""
+    expenditure_data = pd.read_excel(file_path, skiprows=9)
+
+    # Rename columns for easier access
+    expenditure_data.columns = ['Type_of_Goods_and_Services'] + EXPENDITURE_COLUMNS
+
+    # Drop rows where 'Type_of_Goods_and_Services' is NaN
+    expenditure_data = expenditure_data.dropna(subset=['Type_of_Goods_and_Services'])
+
+    # Convert expenditure columns to numeric
+    expenditure_data[EXPENDITURE_COLUMNS] = expenditure_data[EXPENDITURE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+
+    # Drop rows with NaN values
+    return expenditure_data.dropna(subset=EXPENDITURE_COLUMNS)
+
+
+def file_sha256(file_path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _snapshot_path(file_path, sha256):
+    directory, name = os.path.split(file_path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(directory, SNAPSHOT_DIR, f"{stem}-{sha256[:16]}.parquet")
+
+
+def _read_or_build_snapshot(file_path):
+    snapshot = _snapshot_path(file_path, file_sha256(file_path))
+    if os.path.exists(snapshot):
+        try:
+            return pd.read_parquet(snapshot)
+        except Exception as e:
+            print(f"Could not read expenditure snapshot {snapshot}, re-parsing the workbook. Error: {e}")
+
+    expenditure_data = parse_expenditure_workbook(file_path)
+
+    # The snapshot is only an optimisation, so failing to write it must not break the page
+    try:
+        os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+        temporary = f"{snapshot}.{os.getpid()}.tmp"
+        expenditure_data.to_parquet(temporary)
+        os.replace(temporary, snapshot)
+    except Exception as e:
+        print(f"Could not write expenditure snapshot {snapshot}. Error: {e}")
+    return expenditure_data
+
+
+def _freeze(expenditure_data):
+    """Rebuild the frame on top of a read-only array so shared copies cannot be modified in place."""
+    values = expenditure_data[EXPENDITURE_COLUMNS].to_numpy(dtype=float)
+    values.setflags(write=False)
+    frozen = pd.DataFrame(values, columns=EXPENDITURE_COLUMNS, index=expenditure_data.index, copy=False)
+    frozen.insert(0, 'Type_of_Goods_and_Services', expenditure_data['Type_of_Goods_and_Services'].to_numpy())
+    return frozen
+
+
+def _shared_expenditure_data(file_path=EXPENDITURE_FILE):
+    """The cached, read-only frame of the workbook, parsed at most once per process. Never hand it out."""
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+    expenditure_data = _loaded.get(key)
+    if expenditure_data is None:
+        with _lock:
+            expenditure_data = _loaded.get(key)
+            if expenditure_data is None:
+                expenditure_data = _freeze(_read_or_build_snapshot(file_path))
+                # Drop frames of older versions of the same file
+                for stale in [k for k in _loaded if k[0] == key[0]]:
+                    del _loaded[stale]
+                _loaded[key] = expenditure_data
+    return expenditure_data
+
+
+def load_expenditure_data(file_path=EXPENDITURE_FILE):
+    """
+    Return the cleaned expenditure table, parsing the workbook at most once per process.
+
+    Returns:
+        pd.DataFrame: The caller's own copy, with 'Type_of_Goods_and_Services', 'Total' and the five
+        'Income_Quintile_*' columns.
+    """
+    return _shared_expenditure_data(file_path).copy()
+
+
+# Life Simulator spending categories and the expenditure survey rows they are compared against
+CATEGORY_MAPPING = {
+    'food': ['FOOD AND NON-ALCOHOLIC BEVERAGES', 'FOOD SERVING SERVICES'],  # Food combines both categories
+    'transport': 'TRANSPORT',
+    'travel': 'RECREATION AND CULTURE',
+    'housing': 'Imputed Rental for Owner-Occupied Accommodation',
+    'utilities': 'HOUSING AND UTILITIES',
+    'healthcare': 'HEALTH',
+    'education': 'EDUCATION',
+    'personal_care': 'PERSONAL CARE',
+    'communication': 'COMMUNICATION',
+    'clothing': 'CLOTHING AND FOOTWEAR'
+}
+SIMULATOR_CATEGORIES = tuple(CATEGORY_MAPPING)
+
+# Readable names of the income quintiles, in the order of QUINTILE_COLUMNS
+QUINTILE_LABELS = (
+    'Bottom 20% of Households',
+    'Lower Middle 20% of Households',
+    'Middle 20% of Households',
+    'Upper Middle 20% of Households',
+    'Top 20% of Households',
+)
+
+# Household income percentile at the middle of each quintile, used to interpolate a user's position
+QUINTILE_MIDPOINTS = np.array([10.0, 30.0, 50.0, 70.0, 90.0])
+
+# Indexes of the most recently used frames, keyed by id() and holding the frame itself: while an entry exists its
+# frame cannot be freed, so its id cannot be reused by another frame. Sessions run in threads, hence the lock
+MAX_CACHED_INDEXES = 8
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def build_expenditure_index(expenditure_data):
+    """
+    Build the category -> quintile spend index used for peer comparison.
+
+    Returns:
+        dict: 'categories' (SIMULATOR_CATEGORIES) and 'quintile_spend', a (categories x 5) array of the
+        average monthly spend of each income quintile. Categories missing from the survey are NaN rows.
+    """
+    rows = expenditure_data.groupby('Type_of_Goods_and_Services', sort=False)[QUINTILE_COLUMNS].first()
+    quintile_spend = np.full((len(SIMULATOR_CATEGORIES), len(QUINTILE_COLUMNS)), np.nan)
+
+    for position, category in enumerate(SIMULATOR_CATEGORIES):
+        survey_categories = CATEGORY_MAPPING[category]
+        if isinstance(survey_categories, str):
+            survey_categories = [survey_categories]
+        present = [name for name in survey_categories if name in rows.index]
+        if present:
+            quintile_spend[position] = rows.loc[present].to_numpy(dtype=float).sum(axis=0)
+
+    quintile_spend.setflags(write=False)
+    return {'categories': SIMULATOR_CATEGORIES, 'quintile_spend': quintile_spend}
+
+
+def get_expenditure_index(expenditure_data=None):
+    """Return the index for `expenditure_data` (the cached survey by default), building it only once."""
+    if expenditure_data is None:
+        expenditure_data = _shared_expenditure_data()
+
+    with _indexes_lock:
+        cached = _indexes.get(id(expenditure_data))
+        if cached is not None and cached[0] is expenditure_data:
+            _indexes.move_to_end(id(expenditure_data))
+            return cached[1]
+
+    # Built outside the lock, so one slow build does not hold up other sessions (a race builds it twice at worst)
+    index = build_expenditure_index(expenditure_data)
+    with _indexes_lock:
+        _indexes[id(expenditure_data)] = (expenditure_data, index)
+        _indexes.move_to_end(id(expenditure_data))
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def compare_spending(spending, index=None):
+    """
+    Compare monthly spending against the income quintiles for many users at once.
+
+    Args:
+        spending: An (N users x categories) array, or a single (categories,) vector, in the order of
+            SIMULATOR_CATEGORIES.
+        index (dict): Result of build_expenditure_index. Defaults to the cached survey index.
+
+    Returns:
+        dict: (N x categories) arrays 'closest_quintile' (0-4, or -1 where the survey lacks the category),
+        'spending_for_quintile' and 'income_percentile' (the user's spend interpolated between quintile
+        midpoints). A single vector gives (categories,) arrays.
+    """
+    if index is None:
+        index = get_expenditure_index()
+    quintile_spend = index['quintile_spend']
+    spending = np.asarray(spending, dtype=float)
+    single = spending.ndim == 1
+    spending = np.atleast_2d(spending)
+    missing = np.isnan(quintile_spend[:, 0])
+
+    # Nearest quintile for every user and category in one broadcast: (N x categories x quintiles)
+    distance = np.abs(spending[:, :, None] - np.where(missing[:, None], np.inf, quintile_spend)[None, :, :])
+    closest_quintile = distance.argmin(axis=2)
+    spending_for_quintile = np.take_along_axis(quintile_spend[None, :, :], closest_quintile[:, :, None], axis=2)[:, :, 0]
+    closest_quintile[:, missing] = -1
+
+    # Spend is not always monotonic in income, so interpolate over each category's sorted quintile spend
+    income_percentile = np.full(spending.shape, np.nan)
+    for position in np.flatnonzero(~missing):
+        order = np.argsort(quintile_spend[position])
+        income_percentile[:, position] = np.interp(spending[:, position], quintile_spend[position, order],
+                                                   QUINTILE_MIDPOINTS[order])
+
+    comparison = {
+        'closest_quintile': closest_quintile,
+        'spending_for_quintile': spending_for_quintile,
+        'income_percentile': income_percentile,
+    }
+    if single:
+        comparison = {key: value[0] for key, value in comparison.items()}
+    return comparison
@@ -0,0 +1,80 @@
+# goal_seek.py
+
+import numpy as np
+
+from simulator.projection import profiles_to_array, project_retirement, accumulation_factors, PROFILE_FIELDS
+
+'''
+Goal-seek on top of the projection engine: instead of dragging sliders until the plan turns "Sustainable",
+solve directly for the earliest sustainable retirement age, the highest sustainable monthly expense and the
+extra savings needed to close a shortfall. Every solver works on a whole batch of profiles at once.
+'''
+
+# Earliest retirement age offered on the Life Simulator page
+MIN_RETIREMENT_AGE = 55
+
+
+def earliest_sustainable_retirement_age(profiles, min_retirement_age=MIN_RETIREMENT_AGE, cpf_model='simple'):
+    """
+    Find the earliest whole retirement age at which each profile's plan is sustainable.
+
+    The surplus at retirement only grows with a later retirement age (more years of contributions and growth,
+    fewer years of withdrawals), so a bisection over integer ages runs on all profiles together and needs
+    about seven evaluations of the projection (with the given cpf_model).
+
+    Returns:
+        np.ndarray: Retirement age per profile. Retiring at life expectancy is always sustainable, so every
+        profile gets an answer.
+    """
+    columns = dict(zip(PROFILE_FIELDS, profiles_to_array(profiles).T))
+    low = np.ceil(np.maximum(columns['age'], min_retirement_age))
+    high = np.maximum(np.ceil(columns['life_expectancy']), low)
+
+    while np.any(low < high):
+        middle = np.floor((low + high) / 2)
+        sustainable = project_retirement(dict(columns, retirement_age=middle), with_path=False,
+                                         cpf_model=cpf_model)['sustainable']
+        high = np.where(sustainable, middle, high)
+        low = np.where(sustainable, low, middle + 1)
+    return low
+
+
+def solve_retirement_goals(profiles, min_retirement_age=MIN_RETIREMENT_AGE, cpf_model='simple'):
+    """
+    Solve what it takes for each profile's retirement plan to become sustainable.
+
+    Returns:
+        dict: 'earliest_sustainable_retirement_age', 'max_sustainable_monthly_expense' (the expense at which
+        savings last exactly until life expectancy), 'required_lump_sum' (extra savings needed today) and
+        'required_monthly_savings' (extra saving per month until retirement, inf if already retired).
+        A single profile dict gives scalars. The extra savings are personal savings growing at the savings
+        growth rate, whichever cpf_model projects the CPF balance.
+    """
+    single = isinstance(profiles, dict) and np.ndim(profiles['age']) == 0
+    columns = dict(zip(PROFILE_FIELDS, profiles_to_array(profiles).T))
+    summary = project_retirement(columns, with_path=False, cpf_model=cpf_model)
+
+    years_until_retirement = summary['drawdown_start_age'] - columns['age']
+    years_of_retirement = np.maximum(columns['life_expectancy'] - summary['drawdown_start_age'], 0)
+    # Without years to draw down (retiring at or after life expectancy) there is no expense to speak of
+    with np.errstate(divide='ignore', invalid='ignore'):
+        max_sustainable_monthly_expense = np.where(years_of_retirement > 0,
+                                                   summary['total_savings_at_retirement'] / (12 * years_of_retirement),
+                                                   np.nan)
+
+    # Closed form: the shortfall at retirement discounted back with the same growth factors as the projection
+    shortfall = np.maximum(summary['total_post_retirement_expenses'] - summary['total_savings_at_retirement'], 0)
+    lump, annuity = accumulation_factors(columns['savings_growth_rate'] / 100, years_until_retirement)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        required_monthly_savings = np.where(shortfall > 0, shortfall / (12 * annuity), 0.0)
+
+    goals = {
+        'earliest_sustainable_retirement_age': earliest_sustainable_retirement_age(columns, min_retirement_age,
+                                                                                  cpf_model),
+        'max_sustainable_monthly_expense': max_sustainable_monthly_expense,
+        'required_lump_sum': shortfall / lump,
+        'required_monthly_savings': required_monthly_savings,
+    }
+    if single:
+        goals = {key: value[0].item() for key, value in goals.items()}
+    return goals
@@ -0,0 +1,84 @@
+# monte_carlo.py
+
+import numpy as np
+
+from simulator.projection import profiles_to_array, PROFILE_FIELDS
+
+'''
+Stochastic counterpart of the projection engine. Instead of a fixed savings growth rate, yearly returns and
+inflation are sampled for thousands of paths at once as (paths x years) arrays.
+
+The cash flows follow simulator/projection.py: until retirement the yearly CPF contribution is added and the
+balance then grows at that year's sampled return; after retirement the monthly expenses (given in today's
+dollars and indexed with the sampled inflation) are drawn down without further growth. With zero volatility
+and zero inflation the median path reproduces the deterministic projection.
+'''
+
+# Percentiles plotted as bands on the fan chart
+FAN_PERCENTILES = (10, 50, 90)
+
+
+def simulate_retirement(profile, n_paths=10_000, return_volatility=6.0, inflation_rate=2.0,
+                        inflation_volatility=1.0, seed=None):
+    """
+    Run a Monte Carlo simulation of a single Life Simulator profile.
+
+    Args:
+        profile (dict): A profile as returned by get_user_input.
+        n_paths (int): Number of simulated return and inflation paths.
+        return_volatility (float): Standard deviation of the yearly return, in percent. The mean is the
+            profile's savings_growth_rate.
+        inflation_rate (float): Mean yearly inflation of post-retirement expenses, in percent.
+        inflation_volatility (float): Standard deviation of yearly inflation, in percent.
+        seed (int): Seed for the random generator. The same seed always gives the same result.
+
+    Returns:
+        dict: 'ages', the P10/P50/P90 balance paths under 'percentiles', the probability of running out of
+        money before life expectancy and the depletion age of every path (inf if it never runs out).
+    """
+    columns = dict(zip(PROFILE_FIELDS, profiles_to_array(profile)[0]))
+    age = int(columns['age'])
+    drawdown_start_age = int(max(columns['retirement_age'], age))
+    life_expectancy = int(max(columns['life_expectancy'], age))
+    years_until_retirement = drawdown_start_age - age
+    years_of_retirement = max(life_expectancy - drawdown_start_age, 0)
+
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(columns['savings_growth_rate'] / 100, return_volatility / 100,
+                         size=(n_paths, years_until_retirement))
+    inflation = rng.normal(inflation_rate / 100, inflation_volatility / 100,
+                           size=(n_paths, life_expectancy - age))
+
+    # Accumulation: balance_t = G_t * (B_0 + c * sum_{k<t} 1 / G_k) with G the cumulative growth factor
+    starting_balance = columns['savings'] + columns['current_cpf_savings']
+    annual_cpf_contributions = columns['income'] * columns['cpf_contribution_rate'] / 100
+    growth = np.cumprod(1 + np.maximum(returns, -0.99), axis=1)
+    discounted = np.ones_like(growth)
+    np.divide(1, growth[:, :-1], out=discounted[:, 1:])
+    accumulation = growth * (starting_balance + annual_cpf_contributions * np.cumsum(discounted, axis=1))
+    savings_at_retirement = accumulation[:, -1] if years_until_retirement else np.full(n_paths, starting_balance)
+
+    # Drawdown: each year's withdrawal is indexed with the inflation accumulated since today
+    price_index = np.ones((n_paths, life_expectancy - age))
+    price_index[:, 1:] = np.cumprod(1 + inflation[:, :-1], axis=1)
+    withdrawals = columns['post_retirement_expenses'] * 12 * price_index[:, years_until_retirement:]
+    cumulative_withdrawals = np.cumsum(withdrawals, axis=1)
+    drawdown = np.maximum(savings_at_retirement[:, None] - cumulative_withdrawals, 0)
+
+    # One balance per age from today to life expectancy, like the deterministic path (a retirement age past
+    # life expectancy would otherwise extend the accumulation beyond it)
+    balances = np.concatenate([np.full((n_paths, 1), starting_balance), accumulation, drawdown], axis=1)
+    balances = balances[:, :life_expectancy - age + 1]
+
+    # Withdrawals only grow, so the number of fully funded years is a simple count
+    years_funded = np.count_nonzero(cumulative_withdrawals <= savings_at_retirement[:, None], axis=1)
+    ran_out = years_funded < years_of_retirement
+    depletion_ages = np.where(ran_out, drawdown_start_age + years_funded, np.inf)
+
+    return {
+        'ages': np.arange(age, age + balances.shape[1]),
+        'percentiles': dict(zip(FAN_PERCENTILES, np.percentile(balances, FAN_PERCENTILES, axis=0))),
+        'probability_of_ruin': ran_out.mean(),
+        'depletion_ages': depletion_ages,
+        'n_paths': n_paths,
+    }
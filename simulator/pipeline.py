@@ -0,0 +1,91 @@
+# pipeline.py
+
+import time
+
+'''
+Incremental recomputation for the Life Simulator page. The page is described as a small dependency graph of
+stages (data load -> peer comparison -> projection -> sustainability -> chart, ...). Each stage declares the
+page inputs it reads and the stages it depends on, and keeps its last result together with the key it was
+computed from. On a Streamlit rerun a stage is only recomputed when one of its own inputs, or the result of
+an upstream stage, has changed; everything else is served from the previous run.
+
+The memo lives in a plain dict supplied by the caller (the page keeps it in st.session_state), so this module
+does not depend on Streamlit.
+'''
+
+
+class Stage:
+    """
+    One step of the pipeline.
+
+    Args:
+        name (str): Unique stage name, used by downstream stages and in the timings.
+        function (callable): Called as function(inputs, upstream), where `inputs` holds only the declared page
+            inputs and `upstream` the results of the declared dependencies, both as dicts.
+        inputs (iterable): Names of the page inputs the stage reads.
+        depends (iterable): Names of the stages whose results it reads.
+    """
+
+    def __init__(self, name, function, inputs=(), depends=()):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.depends = tuple(depends)
+
+
+class Pipeline:
+    """A set of stages, each declared after the stages it depends on."""
+
+    def __init__(self, stages):
+        self.stages = {}
+        for stage in stages:
+            unknown = [name for name in stage.depends if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown or later stages: {unknown}")
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name '{stage.name}'")
+            self.stages[stage.name] = stage
+
+    def run(self, data, memo):
+        """
+        Start a run over the page inputs in `data`, reusing the results kept in `memo` by earlier runs.
+
+        Stages are evaluated lazily when their result is first requested, so a stage whose output is not shown
+        on this rerun (for example a chart in a collapsed branch) costs nothing.
+        """
+        return PipelineRun(self, data, memo)
+
+
+class PipelineRun:
+    """Results of one pass over the pipeline, computed on demand with run[stage_name]."""
+
+    def __init__(self, pipeline, data, memo):
+        self.pipeline = pipeline
+        self.data = data
+        self.memo = memo
+        self.results = {}
+        self.keys = {}
+        self.timings = {}
+
+    def __getitem__(self, name):
+        if name not in self.results:
+            self._evaluate(self.pipeline.stages[name])
+        return self.results[name]
+
+    def _evaluate(self, stage):
+        upstream = {name: self[name] for name in stage.depends}
+
+        # A stage's key is its own inputs plus the keys of everything upstream of it
+        key = (tuple(self.data[field] for field in stage.inputs), tuple(self.keys[name] for name in stage.depends))
+        start = time.perf_counter()
+        previous = self.memo.get(stage.name)
+        recomputed = previous is None or previous[0] != key
+        if recomputed:
+            result = stage.function({field: self.data[field] for field in stage.inputs}, upstream)
+            self.memo[stage.name] = (key, result)
+        else:
+            result = previous[1]
+
+        self.results[stage.name] = result
+        self.keys[stage.name] = key
+        self.timings[stage.name] = {'seconds': time.perf_counter() - start, 'recomputed': recomputed}
@@ -0,0 +1,192 @@
+# projection.py
+
+import numpy as np
+
+from simulator.cpf import project_cpf_accounts, retirement_savings
+
+'''
+Savings projection engine shared by the Life Simulator chart and the retirement sustainability check.
+Every quantity is computed with NumPy array operations so that the same code serves a single user on the
+Streamlit page and a cohort of profiles in a batch run.
+
+The model, per year until retirement:
+    - the yearly CPF contribution (income * CPF contribution rate) is added to the CPF balance
+    - CPF and personal savings then both grow at the savings growth rate
+After retirement the monthly post-retirement expenses are drawn down from the combined balance until it
+reaches zero or the user reaches their life expectancy.
+'''
+
+# Order of the fields when profiles are passed as an (N x fields) array
+PROFILE_FIELDS = (
+    'age',
+    'income',
+    'savings',
+    'retirement_age',
+    'post_retirement_expenses',
+    'savings_growth_rate',
+    'life_expectancy',
+    'current_cpf_savings',
+    'cpf_contribution_rate',
+)
+
+
+def profiles_to_array(profiles):
+    """
+    Convert profiles into an (N x len(PROFILE_FIELDS)) float array.
+
+    Args:
+        profiles: A single profile dict (as returned by get_user_input), a dict of equally sized arrays,
+            a list of profile dicts, a pandas DataFrame, or an array that is already (N x fields).
+
+    Returns:
+        np.ndarray: A 2-D float array with one row per profile.
+    """
+    if isinstance(profiles, dict):
+        columns = [np.atleast_1d(np.asarray(profiles[field], dtype=float)) for field in PROFILE_FIELDS]
+        return np.column_stack(np.broadcast_arrays(*columns))
+    if hasattr(profiles, 'columns'):  # pandas DataFrame
+        return profiles[list(PROFILE_FIELDS)].to_numpy(dtype=float)
+    if isinstance(profiles, (list, tuple)) and profiles and isinstance(profiles[0], dict):
+        return np.array([[profile[field] for field in PROFILE_FIELDS] for profile in profiles], dtype=float)
+    return np.atleast_2d(np.asarray(profiles, dtype=float))
+
+
+def accumulation_factors(growth_rate, years):
+    """
+    Growth factors after `years` years at `growth_rate` (as a decimal).
+
+    Returns:
+        tuple: (lump, annuity) where a lump sum grows to `lump` times its value and a contribution paid at
+        the start of every year grows to `annuity` times the yearly amount.
+    """
+    growth_rate = np.asarray(growth_rate, dtype=float)
+    lump = (1 + growth_rate) ** years
+
+    # Contributions are added before the year's growth is applied, i.e. an annuity-due.
+    # The ratio is taken on the (small) rate array so the large years array is only touched once.
+    no_growth = growth_rate == 0
+    annuity = (lump - 1) * ((1 + growth_rate) / np.where(no_growth, 1.0, growth_rate))
+    if no_growth.any():
+        annuity = np.where(no_growth, years, annuity)
+    return lump, annuity
+
+
+def retirement_summary(age, income, savings, retirement_age, post_retirement_expenses, savings_growth_rate,
+                       life_expectancy, current_cpf_savings, cpf_contribution_rate, cpf_at_retirement=None):
+    """
+    Closed-form savings at retirement, drawdown and depletion age.
+
+    All arguments are scalars or NumPy arrays that broadcast against each other, with rates given in percent
+    as on the Life Simulator page. This lets callers evaluate whole grids of inputs in one call.
+    If cpf_at_retirement is given (e.g. from the monthly CPF account engine) it replaces the simple model's
+    CPF balance, which grows at the savings growth rate.
+
+    Returns:
+        dict: Arrays of the broadcast shape for the savings at retirement, the expenses over retirement,
+        the depletion age and whether the plan is sustainable.
+    """
+    growth_rate = np.asarray(savings_growth_rate, dtype=float) / 100
+
+    # Users already past their planned retirement age start drawing down immediately
+    drawdown_start_age = np.maximum(retirement_age, age)
+    years_until_retirement = drawdown_start_age - age
+    years_of_retirement = np.maximum(life_expectancy - drawdown_start_age, 0)
+
+    lump, annuity = accumulation_factors(growth_rate, years_until_retirement)
+    if cpf_at_retirement is None:
+        annual_cpf_contributions = np.multiply(income, cpf_contribution_rate) / 100
+        cpf_at_retirement = current_cpf_savings * lump + annual_cpf_contributions * annuity
+    personal_savings_at_retirement = savings * lump
+    total_savings_at_retirement = cpf_at_retirement + personal_savings_at_retirement
+
+    annual_withdrawal = np.multiply(post_retirement_expenses, 12.0)
+    total_post_retirement_expenses = annual_withdrawal * years_of_retirement
+
+    # Savings do not grow after retirement, so the balance falls linearly until it is used up
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depletion_age = np.where(annual_withdrawal > 0,
+                                 drawdown_start_age + total_savings_at_retirement / annual_withdrawal,
+                                 np.inf)
+
+    return {
+        'drawdown_start_age': drawdown_start_age,
+        'cpf_at_retirement': cpf_at_retirement,
+        'personal_savings_at_retirement': personal_savings_at_retirement,
+        'total_savings_at_retirement': total_savings_at_retirement,
+        'annual_withdrawal': annual_withdrawal,
+        'total_post_retirement_expenses': total_post_retirement_expenses,
+        'depletion_age': depletion_age,
+        'sustainable': total_savings_at_retirement >= total_post_retirement_expenses,
+    }
+
+
+def project_retirement(profiles, with_path=True, cpf_model='simple'):
+    """
+    Project CPF and personal savings for one profile or a batch of profiles.
+
+    Args:
+        profiles: Anything accepted by profiles_to_array.
+        with_path (bool): Also compute the age-indexed balances. Leave this off when only the
+            sustainability figures are needed, since the path is an (N x ages) array.
+        cpf_model (str): 'simple' grows one CPF balance at the savings growth rate. 'monthly' uses the
+            OA/SA/MA/RA account engine in simulator/cpf.py and adds its balances under 'cpf_accounts'.
+
+    Returns:
+        dict: The fields of retirement_summary as arrays of length N and, if with_path is set,
+        'ages' (shared age axis), 'cpf' and 'savings' (balances before withdrawals) and 'total'
+        (combined balance after withdrawals). Path entries outside a profile's current age to life
+        expectancy are NaN. A single profile dict gives scalars and 1-D paths instead.
+    """
+    single = isinstance(profiles, dict) and np.ndim(profiles['age']) == 0
+    data = profiles_to_array(profiles)
+    columns = dict(zip(PROFILE_FIELDS, data.T))
+
+    cpf_accounts = None
+    if cpf_model == 'monthly':
+        cpf_accounts = project_cpf_accounts(columns['age'], columns['income'], columns['current_cpf_savings'],
+                                            columns['retirement_age'], columns['cpf_contribution_rate'])
+        projection = retirement_summary(**columns, cpf_at_retirement=retirement_savings(cpf_accounts['at_retirement']))
+        projection['cpf_accounts'] = cpf_accounts['at_retirement']
+    elif cpf_model == 'simple':
+        projection = retirement_summary(**columns)
+    else:
+        raise ValueError(f"Unknown CPF model: {cpf_model}")
+
+    if with_path:
+        age = columns['age'][:, None]
+        life_expectancy = np.maximum(columns['life_expectancy'], columns['age'])[:, None]
+        growth_rate = columns['savings_growth_rate'][:, None] / 100
+        drawdown_start_age = projection['drawdown_start_age'][:, None]
+
+        ages = np.arange(np.floor(age.min()), np.ceil(life_expectancy.max()) + 1)
+        years_saving = np.clip(ages - age, 0, drawdown_start_age - age)
+        # Nothing is withdrawn when the planned retirement age is past life expectancy
+        years_withdrawing = np.clip(ages - drawdown_start_age, 0, np.maximum(life_expectancy - drawdown_start_age, 0))
+
+        lump, annuity = accumulation_factors(growth_rate, years_saving)
+        annual_cpf_contributions = (columns['income'] * columns['cpf_contribution_rate'] / 100)[:, None]
+        if cpf_accounts is None:
+            cpf = columns['current_cpf_savings'][:, None] * lump
+            cpf += annual_cpf_contributions * annuity
+        else:
+            # The account engine records balances on every birthday from the current age
+            yearly = retirement_savings(cpf_accounts['yearly'])
+            years_since_today = np.clip(ages - age, 0, yearly.shape[1] - 1).astype(int)
+            cpf = np.take_along_axis(yearly, years_since_today, axis=1)
+        savings = np.multiply(columns['savings'][:, None], lump, out=lump)
+        total = cpf + savings
+        total -= projection['annual_withdrawal'][:, None] * years_withdrawing
+        np.maximum(total, 0, out=total)
+
+        # Blank out ages before the user's current age and after their life expectancy
+        outside = (ages < age) | (ages > life_expectancy)
+        for path in (cpf, savings, total):
+            path[outside] = np.nan
+
+        projection.update({'ages': ages, 'cpf': cpf, 'savings': savings, 'total': total})
+
+    if single:
+        projection = {key: (value if key == 'ages' else value[0]) for key, value in projection.items()}
+        projection = {key: (value.item() if np.ndim(value) == 0 and key != 'cpf_accounts' else value)
+                      for key, value in projection.items()}
+    return projection
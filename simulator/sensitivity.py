@@ -0,0 +1,49 @@
+# sensitivity.py
+
+import numpy as np
+
+from simulator.projection import retirement_summary, PROFILE_FIELDS
+
+'''
+What-if grid for the Life Simulator: the retirement surplus (or shortfall) of one profile over every
+combination of savings growth rate, retirement age and CPF contribution rate, computed as a single
+broadcast call to the projection engine rather than one page rerun per combination.
+'''
+
+# Grid axes matching the ranges and steps of the Life Simulator sliders
+GROWTH_RATES = np.round(np.arange(0, 101) * 0.1, 1)
+RETIREMENT_AGES = np.arange(55, 71)
+CPF_CONTRIBUTION_RATES = np.round(np.arange(0, 75) * 0.5, 1)
+
+# Profile fields replaced by the grid axes; the grid only reads the other fields of the profile
+GRID_AXES = ('savings_growth_rate', 'retirement_age', 'cpf_contribution_rate')
+
+
+def sustainability_grid(profile, growth_rates=GROWTH_RATES, retirement_ages=RETIREMENT_AGES,
+                        cpf_contribution_rates=CPF_CONTRIBUTION_RATES):
+    """
+    Evaluate the retirement surplus of a profile over a growth rate x retirement age x CPF rate grid.
+
+    Returns:
+        dict: The three axes and 'surplus', a (growth rates x retirement ages x CPF rates) array of savings
+        at retirement minus expenses over retirement. Negative values are shortfalls.
+    """
+    columns = {field: float(profile[field]) for field in PROFILE_FIELDS if field not in GRID_AXES}
+    growth_rates = np.asarray(growth_rates, dtype=float)
+    retirement_ages = np.asarray(retirement_ages, dtype=float)
+    cpf_contribution_rates = np.asarray(cpf_contribution_rates, dtype=float)
+
+    # Each axis gets its own dimension so the engine broadcasts over the whole grid at once
+    columns.update({
+        'savings_growth_rate': growth_rates[:, None, None],
+        'retirement_age': retirement_ages[None, :, None],
+        'cpf_contribution_rate': cpf_contribution_rates[None, None, :],
+    })
+    summary = retirement_summary(**columns)
+
+    return {
+        'growth_rates': growth_rates,
+        'retirement_ages': retirement_ages,
+        'cpf_contribution_rates': cpf_contribution_rates,
+        'surplus': summary['total_savings_at_retirement'] - summary['total_post_retirement_expenses'],
+    }
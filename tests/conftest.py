@@ -0,0 +1,10 @@
+# conftest.py
+
+import os
+import sys
+
+'''
+Tests run from the project root (`python -m pytest`), importing the app's modules the way the pages do.
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
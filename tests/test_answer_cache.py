@@ -0,0 +1,76 @@
+# test_answer_cache.py
+
+import pytest
+
+from llm import answer_cache as answer_cache_module
+from llm.answer_cache import AnswerCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache_module.time, 'time', clock)
+    return clock
+
+
+def make_cache(tmp_path, **options):
+    return AnswerCache(str(tmp_path / 'answers.sqlite3'), **options)
+
+
+def test_normalized_queries_share_an_entry(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put("What is the CPF Retirement Sum?", "answer")
+    assert normalize_query("  what is the cpf retirement sum ") == "what is the cpf retirement sum"
+    assert cache.get("what is the  CPF retirement sum") == "answer"
+    assert cache.get("What is the CPF Retirement Sum?", kg_version="other graph") is None
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("q", "answer")
+    clock.now += 60
+    assert cache.get("q") == "answer"
+    clock.now += 1
+    assert cache.get("q") is None
+    assert cache.queries() == [] and cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("first", "1")
+    clock.now += 1
+    cache.put("second", "2")
+    clock.now += 1
+    assert cache.get("first") == "1"  # Now more recently used than "second"
+    clock.now += 1
+    cache.put("third", "3")
+
+    assert cache.queries() == ["third", "first"]
+    assert cache.get("second") is None
+
+
+def test_invalidate_drops_every_answer(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put("q", "answer")
+    cache.invalidate()
+    assert cache.get("q") is None
+
+
+def test_stats_count_hits_and_misses_across_instances(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put("q", "answer")
+    cache.get("q")
+    cache.get("unknown")
+    cache.get("q", record=False)
+    make_cache(tmp_path).record("semantic_hits")
+
+    assert make_cache(tmp_path).stats() == {'entries': 1, 'hits': 2, 'semantic_hits': 1, 'misses': 1,
+                                            'hit_rate': 2 / 3}
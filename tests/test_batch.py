@@ -0,0 +1,48 @@
+# test_batch.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulator.batch import main, score_profiles
+
+ROWS = 2000
+
+
+def profiles():
+    rng = np.random.default_rng(0)
+    age = rng.integers(25, 60, ROWS)
+    return pd.DataFrame({
+        'customer_id': [f'C{i:05d}' for i in range(ROWS)],
+        # Empty for the first chunks, so its type is only known from later ones
+        'note': [None] * 1500 + ['vip'] * (ROWS - 1500),
+        'age': age,
+        'income': rng.integers(20_000, 200_000, ROWS),
+        'savings': rng.integers(0, 500_000, ROWS),
+        'retirement_age': age + rng.integers(5, 30, ROWS),
+        'post_retirement_expenses': rng.integers(1000, 8000, ROWS),
+        'savings_growth_rate': rng.uniform(0, 6, ROWS),
+        'life_expectancy': np.full(ROWS, 85),
+        'current_cpf_savings': rng.integers(0, 300_000, ROWS),
+        'cpf_contribution_rate': np.full(ROWS, 20),
+        'food': rng.integers(0, 2000, ROWS),
+        'transport': rng.integers(0, 1000, ROWS),
+    })
+
+
+@pytest.mark.parametrize("extension", ["parquet", "csv"])
+def test_round_trip_over_several_chunks(tmp_path, extension):
+    input_path = tmp_path / "profiles.csv"
+    output_path = tmp_path / f"results.{extension}"
+    profiles().to_csv(input_path, index=False)
+
+    stats = main([str(input_path), "-o", str(output_path), "--chunk-size", "500", "--workers", "1"])
+    assert stats['profiles'] == ROWS and stats['chunks'] == 4
+
+    results = pd.read_parquet(output_path) if extension == "parquet" else pd.read_csv(output_path)
+    expected = score_profiles(pd.read_csv(input_path, dtype={'customer_id': str, 'note': str}))
+    assert list(results.columns) == list(expected.columns)
+    assert results['customer_id'].tolist() == expected['customer_id'].tolist()
+    assert results['note'].isna().sum() == 1500 and (results['note'].iloc[1500:] == 'vip').all()
+    for column in expected.columns.drop(['customer_id', 'note']):
+        np.testing.assert_allclose(results[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float))
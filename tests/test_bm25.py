@@ -0,0 +1,83 @@
+# test_bm25.py
+
+import math
+from collections import Counter
+
+import pytest
+
+from retrieval.bm25 import BM25Index, K1, B, tokenize, format_corpus_answer
+
+PASSAGES = [
+    {'url': 'https://cpf.gov.sg/a', 'text': "What happens to my Special Account at 55? Savings move to the Retirement Account."},
+    {'url': 'https://cpf.gov.sg/a', 'text': "The Special Account is closed at 55 and its savings transferred."},
+    {'url': 'https://cpf.gov.sg/b', 'text': "CPF LIFE payouts start from the payout eligibility age of 65."},
+    {'url': 'https://cpf.gov.sg/c', 'text': "MediSave savings pay for hospitalisation and approved medical insurance."},
+    {'url': 'https://cpf.gov.sg/d', 'text': "Top up your Special Account or Retirement Account to earn more interest."},
+]
+
+
+def reference_scores(query, passages):
+    # Textbook BM25 over the same tokenizer
+    documents = [Counter(tokenize(passage['text'])) for passage in passages]
+    average_length = sum(sum(document.values()) for document in documents) / len(documents)
+    scores = []
+    for document in documents:
+        score = 0.0
+        length = sum(document.values())
+        for term in set(tokenize(query)):
+            frequency = sum(term in other for other in documents)
+            if term not in document:
+                continue
+            idf = math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+            tf = document[term]
+            score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+        scores.append(score)
+    return scores
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("What are the CPF payouts and policies?") == ["cpf", "payout", "policy"]
+    assert tokenize("Access business status") == ["access", "business", "status"]
+
+
+@pytest.mark.parametrize("query", ["special account at 55", "payouts", "retirement account interest",
+                                   "medisave hospitalisation insurance"])
+def test_scores_match_textbook_bm25(query):
+    index = BM25Index.build(PASSAGES)
+    hits = index.search(query, k=len(PASSAGES), min_coverage=0.0, one_per_url=False)
+    expected = reference_scores(query, PASSAGES)
+
+    texts = [passage['text'] for passage in PASSAGES]
+    for hit in hits:
+        assert hit['score'] == pytest.approx(expected[texts.index(hit['content'])], rel=1e-5)
+    assert [hit['score'] for hit in hits] == sorted((hit['score'] for hit in hits), reverse=True)
+    assert len(hits) == len(PASSAGES)
+
+
+def test_best_passage_per_url_ranks_first():
+    hits = BM25Index.build(PASSAGES).search("special account at 55", k=3)
+    assert [hit['url'] for hit in hits][0] == 'https://cpf.gov.sg/a'
+    assert len({hit['url'] for hit in hits}) == len(hits)
+
+
+def test_passages_covering_too_little_of_the_query_are_left_out():
+    index = BM25Index.build(PASSAGES)
+    # "medisave" alone is well under the required share of this query's IDF
+    assert index.search("medisave quantum blockchain") == []
+    assert index.search("the of and") == []
+    hit = index.search("medisave insurance")[0]
+    assert hit['url'] == 'https://cpf.gov.sg/c' and hit['coverage'] == pytest.approx(1.0)
+
+
+def test_saved_index_gives_the_same_results(tmp_path):
+    index = BM25Index.build(PASSAGES)
+    path = str(tmp_path / 'index' / 'bm25.npz')
+    index.save(path)
+    assert BM25Index.load(path).search("retirement account") == index.search("retirement account")
+
+
+def test_format_corpus_answer_numbers_the_references():
+    hits = BM25Index.build(PASSAGES).search("special account", k=2)
+    answer = format_corpus_answer(hits)
+    assert f"{hits[0]['content']} [1]" in answer
+    assert answer.endswith(f"- [1] {hits[0]['url']}\n- [2] {hits[1]['url']}")
@@ -0,0 +1,76 @@
+# test_chart_cache.py
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+import life_simulator
+from life_simulator import chart_key, render_chart
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(life_simulator, '_chart_cache', type(life_simulator._chart_cache)())
+    monkeypatch.setattr(life_simulator, 'CHART_CACHE_SIZE', 3)
+
+
+class Drawer:
+    def __init__(self):
+        self.calls = 0
+        self.figures = []
+
+    def __call__(self):
+        self.calls += 1
+        fig, ax = plt.subplots(figsize=(1, 1))
+        ax.plot([0, 1], [0, self.calls])
+        self.figures.append(fig)
+        return fig
+
+
+def test_key_depends_on_every_input():
+    assert chart_key('c', 1, np.arange(3)) == chart_key('c', 1, np.arange(3))
+    assert chart_key('c', 1, np.arange(3)) != chart_key('c', 1, np.arange(4))
+    assert chart_key('c', 1) != chart_key('c', 2) != chart_key('d', 2)
+
+
+def test_hits_skip_drawing_and_misses_close_the_figure():
+    draw = Drawer()
+    png = render_chart(chart_key('c', 1), draw)
+    assert png.startswith(b'\x89PNG') and draw.calls == 1
+    assert not plt.fignum_exists(draw.figures[0].number)
+
+    assert render_chart(chart_key('c', 1), draw) is png
+    assert draw.calls == 1
+
+
+def test_least_recently_used_chart_is_evicted():
+    draw = Drawer()
+    for value in (1, 2, 3):
+        render_chart(chart_key('c', value), draw)
+    render_chart(chart_key('c', 1), draw)  # Now the most recently used
+    render_chart(chart_key('c', 4), draw)  # Evicts 2
+    assert draw.calls == 4 and len(life_simulator._chart_cache) == 3
+
+    render_chart(chart_key('c', 1), draw)
+    assert draw.calls == 4
+    render_chart(chart_key('c', 2), draw)
+    assert draw.calls == 5
+
+
+def test_figure_is_closed_when_saving_fails(monkeypatch):
+    closed = []
+    close = plt.close
+    monkeypatch.setattr(life_simulator.plt, 'close', lambda fig: closed.append(fig) or close(fig))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    def broken_figure():
+        figure = plt.figure()
+        figure.savefig = fail
+        return figure
+
+    with pytest.raises(RuntimeError):
+        render_chart(chart_key('broken'), broken_figure)
+    assert len(closed) == 1 and not plt.fignum_exists(closed[0].number)
+    assert chart_key('broken') not in life_simulator._chart_cache
@@ -0,0 +1,77 @@
+# test_cpf.py
+
+import numpy as np
+import pytest
+
+from simulator import cpf
+from simulator.cpf import (project_cpf_accounts, _transfer_at_55, _cap_medisave, ALLOCATION_BY_AGE, ACCOUNTS,
+                           ORDINARY_WAGE_CEILING, FULL_RETIREMENT_SUM, BASIC_HEALTHCARE_SUM, OA, SA, MA, RA)
+
+
+def as_matrix(accounts):
+    return np.column_stack([accounts[account] for account in ACCOUNTS])
+
+
+@pytest.fixture
+def no_interest(monkeypatch):
+    monkeypatch.setattr(cpf, 'BASE_INTEREST', np.zeros(4))
+    monkeypatch.setattr(cpf, 'EXTRA_INTEREST_BY_GROUP', np.zeros((2, 2)))
+
+
+def test_one_year_of_contributions_follows_the_age_band(no_interest):
+    accounts = project_cpf_accounts(30, 60_000, 0, 31)['at_retirement']
+    np.testing.assert_allclose(as_matrix(accounts)[0], 12 * 5_000 * ALLOCATION_BY_AGE[30])
+
+
+def test_wages_above_the_ceiling_contribute_as_at_the_ceiling():
+    at_ceiling = project_cpf_accounts(40, 12 * ORDINARY_WAGE_CEILING, 10_000, 50)
+    above = project_cpf_accounts(40, 24 * ORDINARY_WAGE_CEILING, 10_000, 50)
+    np.testing.assert_array_equal(as_matrix(above['at_retirement']), as_matrix(at_ceiling['at_retirement']))
+
+
+@pytest.mark.parametrize("oa, sa, ra, expected", [
+    # SA alone fills the RA; the rest of the SA moves to the OA
+    (10_000, 250_000, 0, (10_000 + 250_000 - FULL_RETIREMENT_SUM, 0, FULL_RETIREMENT_SUM)),
+    # SA first, then OA up to the Full Retirement Sum
+    (200_000, 100_000, 0, (300_000 - FULL_RETIREMENT_SUM, 0, FULL_RETIREMENT_SUM)),
+    # Not enough: everything goes to the RA
+    (50_000, 60_000, 0, (0, 0, 110_000)),
+    # An existing RA balance reduces the room
+    (100_000, 100_000, 200_000, (100_000 + 100_000 - (FULL_RETIREMENT_SUM - 200_000), 0, FULL_RETIREMENT_SUM)),
+])
+def test_transfer_at_55(oa, sa, ra, expected):
+    balances = np.array([[oa, sa, 5_000, ra]], dtype=float)
+    _transfer_at_55(balances)
+    np.testing.assert_allclose(balances[0, [OA, SA, RA]], expected)
+    assert balances[0, MA] == 5_000
+
+
+def test_medisave_overflow_goes_to_sa_before_55_and_ra_after():
+    balances = np.array([[0, 0, BASIC_HEALTHCARE_SUM + 1_000, 0], [0, 0, BASIC_HEALTHCARE_SUM + 2_000, 0],
+                         [0, 0, BASIC_HEALTHCARE_SUM - 1, 0]], dtype=float)
+    _cap_medisave(balances, np.array([1.0, 0.0, 1.0]), np.array([0.0, 1.0, 0.0]))
+    np.testing.assert_allclose(balances, [[0, 1_000, BASIC_HEALTHCARE_SUM, 0], [0, 0, BASIC_HEALTHCARE_SUM, 2_000],
+                                          [0, 0, BASIC_HEALTHCARE_SUM - 1, 0]])
+
+
+@pytest.mark.parametrize("retirement_age", [50.5, 60.5])
+def test_medisave_stays_capped_after_a_final_part_year(retirement_age):
+    # MA starts at the cap, so the interest of the final half year would push it over
+    age = retirement_age - 1.5
+    allocation = ALLOCATION_BY_AGE[int(age)]
+    savings = BASIC_HEALTHCARE_SUM / (allocation[MA] / allocation.sum())
+    accounts = project_cpf_accounts(age, 0, savings, retirement_age)['at_retirement']
+    assert accounts['ma'][0] == pytest.approx(BASIC_HEALTHCARE_SUM)
+    assert (accounts['sa'][0] > 0) == (retirement_age < 55)
+
+
+def test_batch_matches_profiles_one_at_a_time():
+    profiles = [(25, 36_000, 0, 65, 37), (54.5, 120_000, 300_000, 62, 37), (40, 200_000, 80_000, 55.25, 20),
+                (70, 50_000, 100_000, 65, 37), (50, 90_000, 150_000, 58, 30)]
+    batch = project_cpf_accounts(*np.array(profiles).T)
+    for position, profile in enumerate(profiles):
+        single = project_cpf_accounts(*profile)
+        np.testing.assert_allclose(as_matrix(batch['at_retirement'])[position], as_matrix(single['at_retirement'])[0])
+        years = single['yearly'].shape[1]
+        np.testing.assert_allclose(as_matrix(batch['yearly'][position, :years]),
+                                   as_matrix(single['yearly'][0]))
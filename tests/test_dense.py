@@ -0,0 +1,48 @@
+# test_dense.py
+
+import numpy as np
+
+from retrieval import dense
+from retrieval.dense import DenseIndex, build_ivf
+
+
+def random_index(rows=600, dimension=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(rows, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    urls = [f"https://cpf.gov.sg/{row // 3}" for row in range(rows)]  # Three passages per page
+    return DenseIndex(vectors.astype(np.float16), urls, [f"passage {row}" for row in range(rows)])
+
+
+def test_search_returns_the_closest_page_first():
+    index = random_index()
+    query = index.vectors[42].astype(np.float32) * 3  # Scale does not matter
+    hits = index.search(query, k=5)
+
+    assert hits[0]['content'] == "passage 42" and hits[0]['similarity'] > 0.99
+    assert len({hit['url'] for hit in hits}) == 5
+    assert [hit['similarity'] for hit in hits] == sorted((hit['similarity'] for hit in hits), reverse=True)
+    assert index.search(query, k=5, min_similarity=0.99) == hits[:1]
+
+
+def test_blockwise_scoring_matches_one_product(monkeypatch):
+    index = random_index()
+    query = np.random.default_rng(1).normal(size=16)
+    _, whole = index.scores(query)
+    monkeypatch.setattr(dense, 'SCORE_BLOCK_ROWS', 64)
+    rows, blockwise = index.scores(query)
+    np.testing.assert_array_equal(rows, np.arange(600))
+    np.testing.assert_allclose(blockwise, whole, rtol=1e-6)
+
+
+def test_ivf_finds_the_exact_best_match_when_probing_every_list():
+    index = random_index()
+    ivf = build_ivf(index.vectors)
+    centroids, indptr, rows = ivf
+    assert len(centroids) == int(np.sqrt(600)) and indptr[-1] == 600
+    assert np.array_equal(np.sort(rows), np.arange(600))
+
+    approximate = DenseIndex(index.vectors, index.urls, index.texts, ivf)
+    for row in (0, 123, 599):
+        query = index.vectors[row].astype(np.float32)
+        assert approximate.search(query, k=1, probes=len(centroids)) == index.search(query, k=1)
+        assert approximate.search(query, k=1)[0]['content'] == f"passage {row}"
@@ -0,0 +1,67 @@
+# test_expenditure.py
+
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from simulator import expenditure
+from simulator.expenditure import (load_expenditure_data, get_expenditure_index, compare_spending,
+                                   EXPENDITURE_FILE, EXPENDITURE_COLUMNS, SIMULATOR_CATEGORIES)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    # A copy, so that the Parquet snapshot is written under tmp_path rather than next to the real workbook
+    path = tmp_path / 'expenditure.xlsx'
+    shutil.copy(EXPENDITURE_FILE, path)
+    return str(path)
+
+
+def test_callers_cannot_change_the_shared_table(workbook):
+    expenditure_data = load_expenditure_data(workbook)
+    original_total = expenditure_data['Total'].to_numpy().copy()
+
+    expenditure_data['Total'] = 0.0
+    expenditure_data.loc[expenditure_data.index[0], 'Income_Quintile_1'] = -1.0
+    expenditure_data['extra'] = 1
+
+    reloaded = load_expenditure_data(workbook)
+    np.testing.assert_array_equal(reloaded['Total'].to_numpy(), original_total)
+    assert reloaded['Income_Quintile_1'].iloc[0] != -1.0
+    assert list(reloaded.columns) == ['Type_of_Goods_and_Services'] + EXPENDITURE_COLUMNS
+
+
+def test_snapshot_gives_the_same_table(workbook):
+    parsed = load_expenditure_data(workbook)
+    # A new process would read the Parquet snapshot written by the first load
+    expenditure._loaded.clear()
+    assert load_expenditure_data(workbook).equals(parsed)
+
+
+def test_spending_at_a_quintile_is_matched_to_it(workbook):
+    index = get_expenditure_index(load_expenditure_data(workbook))
+    present = ~np.isnan(index['quintile_spend'][:, 0])
+    assert len(index['categories']) == len(SIMULATOR_CATEGORIES) and present.any()
+
+    for quintile in range(5):
+        spending = np.where(present, index['quintile_spend'][:, quintile], 0.0)
+        comparison = compare_spending(spending, index)
+        matched = comparison['spending_for_quintile'][present]
+        np.testing.assert_allclose(matched, index['quintile_spend'][present, quintile])
+    assert (comparison['closest_quintile'][~present] == -1).all()
+
+
+def test_index_is_built_once_per_frame_and_safe_across_threads(workbook):
+    expenditure_data = load_expenditure_data(workbook)
+    index = get_expenditure_index(expenditure_data)
+    assert get_expenditure_index(expenditure_data) is index
+
+    # Sessions building and evicting indexes for their own copies at the same time
+    frames = [load_expenditure_data(workbook) for _ in range(4 * expenditure.MAX_CACHED_INDEXES)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        indexes = list(pool.map(get_expenditure_index, frames * 4))
+    assert len(expenditure._indexes) <= expenditure.MAX_CACHED_INDEXES
+    for built in indexes:
+        np.testing.assert_array_equal(built['quintile_spend'], index['quintile_spend'])
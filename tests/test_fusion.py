@@ -0,0 +1,35 @@
+# test_fusion.py
+
+import pytest
+
+from retrieval.fusion import reciprocal_rank_fusion, RRF_K
+
+
+def hits(*urls, source):
+    return [{'url': url, 'content': f"{source} passage of {url}"} for url in urls]
+
+
+def test_urls_found_by_both_rankings_come_first():
+    keyword = hits('a', 'b', 'c', source='keyword')
+    dense = hits('c', 'd', 'a', source='dense')
+    fused = reciprocal_rank_fusion([keyword, dense], k=4)
+
+    assert [hit['url'] for hit in fused] == ['a', 'c', 'b', 'd']
+    assert fused[0]['rrf_score'] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 3))
+    assert fused[2]['rrf_score'] == pytest.approx(1 / (RRF_K + 2))
+
+
+def test_each_url_keeps_its_best_ranked_passage():
+    keyword = hits('x', 'y', source='keyword')
+    dense = hits('y', 'x', source='dense')
+    fused = {hit['url']: hit for hit in reciprocal_rank_fusion([keyword, dense])}
+    assert fused['x']['content'] == "keyword passage of x"
+    assert fused['y']['content'] == "dense passage of y"
+
+
+def test_k_limits_the_results_and_empty_rankings_are_fine():
+    assert reciprocal_rank_fusion([hits('a', 'b', 'c', source='keyword'), []], k=2) == [
+        dict(hits('a', source='keyword')[0], rrf_score=pytest.approx(1 / (RRF_K + 1))),
+        dict(hits('b', source='keyword')[0], rrf_score=pytest.approx(1 / (RRF_K + 2))),
+    ]
+    assert reciprocal_rank_fusion([[], []]) == []
@@ -0,0 +1,72 @@
+# test_goal_seek.py
+
+import math
+
+import numpy as np
+import pytest
+
+from simulator.goal_seek import solve_retirement_goals, earliest_sustainable_retirement_age
+from simulator.projection import project_retirement
+
+PROFILE = {
+    'age': 40, 'income': 60000, 'savings': 50000, 'retirement_age': 65, 'post_retirement_expenses': 4000,
+    'savings_growth_rate': 4.0, 'life_expectancy': 85, 'current_cpf_savings': 80000, 'cpf_contribution_rate': 20,
+}
+
+
+def surplus(profile):
+    summary = project_retirement(profile, with_path=False)
+    return summary['total_savings_at_retirement'] - summary['total_post_retirement_expenses']
+
+
+@pytest.mark.parametrize("cpf_model", ["simple", "monthly"])
+def test_earliest_age_is_the_first_sustainable_one(cpf_model):
+    goals = solve_retirement_goals(PROFILE, cpf_model=cpf_model)
+    earliest = goals['earliest_sustainable_retirement_age']
+    assert 55 < earliest <= PROFILE['life_expectancy']
+    assert project_retirement(dict(PROFILE, retirement_age=earliest), with_path=False,
+                              cpf_model=cpf_model)['sustainable']
+    assert not project_retirement(dict(PROFILE, retirement_age=earliest - 1), with_path=False,
+                                  cpf_model=cpf_model)['sustainable']
+
+
+def test_batch_matches_a_linear_search():
+    rng = np.random.default_rng(1)
+    profiles = [dict(PROFILE, post_retirement_expenses=float(expense), savings=float(savings))
+                for expense, savings in zip(rng.integers(1000, 9000, 20), rng.integers(0, 400000, 20))]
+    solved = earliest_sustainable_retirement_age(profiles)
+    for profile, age in zip(profiles, solved):
+        expected = next(candidate for candidate in range(55, 86)
+                        if project_retirement(dict(profile, retirement_age=candidate), with_path=False)['sustainable'])
+        assert age == expected
+
+
+def test_max_expense_makes_savings_last_exactly():
+    goals = solve_retirement_goals(PROFILE)
+    assert surplus(dict(PROFILE, post_retirement_expenses=goals['max_sustainable_monthly_expense'])) \
+        == pytest.approx(0, abs=1e-6)
+
+
+def test_extra_savings_close_the_shortfall():
+    goals = solve_retirement_goals(PROFILE)
+    assert surplus(PROFILE) < 0 and goals['required_lump_sum'] > 0
+
+    topped_up = dict(PROFILE, savings=PROFILE['savings'] + goals['required_lump_sum'])
+    assert surplus(topped_up) == pytest.approx(0, abs=1e-6)
+
+    # Saving the extra amount every month until retirement gives the same balance at retirement
+    monthly = goals['required_monthly_savings']
+    growth = PROFILE['savings_growth_rate'] / 100
+    years = PROFILE['retirement_age'] - PROFILE['age']
+    extra = sum(12 * monthly * (1 + growth) ** (years - year) for year in range(years))
+    assert extra == pytest.approx(-surplus(PROFILE), rel=1e-9)
+
+
+def test_no_drawdown_period_has_no_maximum_expense():
+    goals = solve_retirement_goals(dict(PROFILE, retirement_age=90))
+    assert math.isnan(goals['max_sustainable_monthly_expense'])
+    assert goals['required_lump_sum'] == 0
+
+    batch = solve_retirement_goals([PROFILE, dict(PROFILE, age=85)])
+    assert np.isfinite(batch['max_sustainable_monthly_expense'][0])
+    assert np.isnan(batch['max_sustainable_monthly_expense'][1])
@@ -0,0 +1,57 @@
+# test_monte_carlo.py
+
+import numpy as np
+import pytest
+
+from simulator.monte_carlo import simulate_retirement, FAN_PERCENTILES
+from simulator.projection import project_retirement
+
+PROFILE = {
+    'age': 40, 'income': 60000, 'savings': 50000, 'retirement_age': 65, 'post_retirement_expenses': 2000,
+    'savings_growth_rate': 4.0, 'life_expectancy': 85, 'current_cpf_savings': 80000, 'cpf_contribution_rate': 20,
+}
+
+
+def deterministic(profile, n_paths=20):
+    return simulate_retirement(profile, n_paths=n_paths, return_volatility=0.0, inflation_rate=0.0,
+                               inflation_volatility=0.0, seed=0)
+
+
+@pytest.mark.parametrize("overrides", [{}, {'post_retirement_expenses': 9000}, {'age': 70, 'retirement_age': 65},
+                                       {'age': 90}, {'age': 85}, {'retirement_age': 90}])
+def test_zero_volatility_reduces_to_the_projection(overrides):
+    profile = dict(PROFILE, **overrides)
+    simulation = deterministic(profile)
+    projection = project_retirement(profile)
+
+    np.testing.assert_array_equal(simulation['ages'], projection['ages'])
+    for percentile in FAN_PERCENTILES:
+        np.testing.assert_allclose(simulation['percentiles'][percentile], projection['total'], rtol=1e-9)
+    assert simulation['probability_of_ruin'] == (0.0 if projection['sustainable'] else 1.0)
+
+
+def test_past_life_expectancy_has_a_single_age():
+    simulation = deterministic(dict(PROFILE, age=90))
+    np.testing.assert_array_equal(simulation['ages'], [90])
+    assert simulation['probability_of_ruin'] == 0.0
+
+
+def test_depletion_age_matches_the_projection():
+    profile = dict(PROFILE, post_retirement_expenses=9000)
+    simulation = deterministic(profile)
+    projection = project_retirement(profile)
+    assert np.all(simulation['depletion_ages'] == np.floor(projection['depletion_age']))
+
+
+def test_same_seed_same_result():
+    first = simulate_retirement(PROFILE, n_paths=500, seed=7)
+    second = simulate_retirement(PROFILE, n_paths=500, seed=7)
+    np.testing.assert_array_equal(first['percentiles'][50], second['percentiles'][50])
+    np.testing.assert_array_equal(first['depletion_ages'], second['depletion_ages'])
+
+
+def test_percentile_bands_are_ordered():
+    simulation = simulate_retirement(PROFILE, n_paths=2000, seed=1)
+    low, median, high = (simulation['percentiles'][percentile] for percentile in FAN_PERCENTILES)
+    assert np.all(low <= median) and np.all(median <= high)
+    assert 0.0 <= simulation['probability_of_ruin'] <= 1.0
@@ -0,0 +1,242 @@
+# test_neo4j_pool.py
+
+import asyncio
+import importlib.util
+import sys
+import types
+
+import pytest
+from neo4j.exceptions import Neo4jError, ServiceUnavailable
+
+# neo4j_pool loads a .env file with python-dotenv on import; without it there is simply nothing to load
+if importlib.util.find_spec("dotenv") is None:
+    placeholder = types.ModuleType("dotenv")
+    placeholder.load_dotenv = lambda *args, **kwargs: False
+    sys.modules["dotenv"] = placeholder
+
+from knowledge_graph import neo4j_pool  # noqa: E402
+from knowledge_graph.neo4j_pool import CircuitBreaker, KGUnavailableError, run_query, run_query_async  # noqa: E402
+
+TIMED_OUT = "Neo.ClientError.Transaction.TransactionTimedOut"
+SYNTAX_ERROR = "Neo.ClientError.Statement.SyntaxError"
+
+
+def neo4j_error(code):
+    return Neo4jError._hydrate_neo4j(code=code, message=code)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(neo4j_pool, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    breaker = CircuitBreaker(failures=2, reset_seconds=30)
+    monkeypatch.setattr(neo4j_pool, 'breaker', breaker)
+    return breaker
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+
+    def data(self):
+        return self.records
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def run(self, query, parameters):
+        self.driver.queries.append((query, parameters))
+        if self.driver.errors:
+            raise self.driver.errors.pop(0)
+        return FakeResult([{'n': 1}])
+
+
+class FakeDriver:
+    """Answers every query with one record, or raises the queued errors first."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.queries = []
+        self.fetch_sizes = []
+
+    def session(self, fetch_size=None):
+        self.fetch_sizes.append(fetch_size)
+        return FakeSession(self)
+
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens_after_the_cooldown(clock):
+    breaker = CircuitBreaker(failures=2, reset_seconds=30)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_success()  # A success in between resets the count
+    breaker.record_failure()
+    assert not breaker.is_open()
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    with pytest.raises(KGUnavailableError):
+        breaker.before_call()
+    clock.now += 30
+    breaker.before_call()  # One trial call is let through...
+    with pytest.raises(KGUnavailableError):
+        breaker.before_call()  # ...and only one
+
+    breaker.record_failure()  # A failed trial keeps it open for another cooldown
+    clock.now += 29
+    with pytest.raises(KGUnavailableError):
+        breaker.before_call()
+    clock.now += 1
+    breaker.before_call()
+    breaker.record_success()
+    assert not breaker.is_open()
+    breaker.before_call()
+
+
+def test_released_trial_lets_the_next_call_try(clock):
+    breaker = CircuitBreaker(failures=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+
+
+def test_run_query_passes_the_timeout_and_parameters(breaker):
+    driver = FakeDriver()
+    assert run_query("MATCH (n) RETURN n", {'id': 1}, timeout=2.5, driver=driver) == [{'n': 1}]
+    query, parameters = driver.queries[0]
+    assert query.text == "MATCH (n) RETURN n" and query.timeout == 2.5 and parameters == {'id': 1}
+    assert driver.fetch_sizes == [neo4j_pool.FETCH_SIZE]
+
+
+def test_timeouts_and_connection_failures_open_the_breaker(breaker):
+    driver = FakeDriver(neo4j_error(TIMED_OUT), ServiceUnavailable("down"))
+    for _ in range(2):
+        with pytest.raises(KGUnavailableError):
+            run_query("RETURN 1", driver=driver)
+    assert breaker.is_open()
+
+    # Skipped at once while open, without touching the driver
+    with pytest.raises(KGUnavailableError):
+        run_query("RETURN 1", driver=driver)
+    assert len(driver.queries) == 2
+
+
+def test_errors_in_the_query_itself_do_not_count(breaker):
+    driver = FakeDriver(*[neo4j_error(SYNTAX_ERROR)] * 3)
+    for _ in range(3):
+        with pytest.raises(Neo4jError):
+            run_query("RETURN", driver=driver)
+    assert not breaker.is_open()
+    assert run_query("RETURN 1", driver=driver) == [{'n': 1}]
+
+
+class FakeAsyncResult:
+    def __init__(self, records):
+        self.records = records
+
+    async def data(self):
+        return self.records
+
+
+class FakeAsyncSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def run(self, query, parameters):
+        self.driver.queries.append((query, parameters))
+        if self.driver.delay:
+            await asyncio.sleep(self.driver.delay)
+        if self.driver.errors:
+            raise self.driver.errors.pop(0)
+        return FakeAsyncResult([{'n': 1}])
+
+
+class FakeAsyncDriver:
+    def __init__(self, *errors, delay=0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.queries = []
+        self.closed = False
+
+    def session(self, fetch_size=None):
+        return FakeAsyncSession(self)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def async_drivers(monkeypatch):
+    created = []
+
+    def driver(*args, **kwargs):
+        created.append(FakeAsyncDriver())
+        return created[-1]
+
+    monkeypatch.setattr(neo4j_pool.AsyncGraphDatabase, 'driver', driver)
+    return created
+
+
+def test_run_query_async(monkeypatch, breaker):
+    driver = FakeAsyncDriver()
+    monkeypatch.setattr(neo4j_pool, 'get_async_driver', lambda: driver)
+    assert asyncio.run(run_query_async("RETURN 1", {'x': 1}, timeout=1)) == [{'n': 1}]
+    assert driver.queries[0][0].timeout == 1
+
+
+def test_run_query_async_gives_up_on_a_hung_server(monkeypatch, breaker):
+    # The server never answers, so the client-side bound (query timeout + connection timeout) ends the call
+    monkeypatch.setattr(neo4j_pool, 'CONNECTION_TIMEOUT_SECONDS', 0.01)
+    monkeypatch.setattr(neo4j_pool, 'get_async_driver', lambda: FakeAsyncDriver(delay=10))
+    for _ in range(2):
+        with pytest.raises(KGUnavailableError):
+            asyncio.run(run_query_async("RETURN 1", timeout=0.01))
+    assert breaker.is_open()
+
+
+def test_run_query_async_does_not_count_query_errors(monkeypatch, breaker):
+    monkeypatch.setattr(neo4j_pool, 'get_async_driver', lambda: FakeAsyncDriver(neo4j_error(SYNTAX_ERROR)))
+    with pytest.raises(Neo4jError):
+        asyncio.run(run_query_async("RETURN"))
+    assert not breaker.is_open()
+
+
+def test_async_drivers_are_per_loop_and_closed_with_it(async_drivers):
+    async def use_and_close():
+        first = neo4j_pool.get_async_driver()
+        assert neo4j_pool.get_async_driver() is first
+        await neo4j_pool.close_async_driver()
+        return first
+
+    first = asyncio.run(use_and_close())
+    second = asyncio.run(use_and_close())
+    assert first is not second and first.closed and second.closed
+    assert len(neo4j_pool._async_drivers) == 0
@@ -0,0 +1,66 @@
+# test_pipeline.py
+
+import pytest
+
+from simulator.pipeline import Pipeline, Stage
+
+
+def counting_pipeline(calls):
+    def stage(name, combine):
+        def function(inputs, upstream):
+            calls.append(name)
+            return combine(inputs, upstream)
+        return function
+
+    return Pipeline([
+        Stage('a', stage('a', lambda inputs, upstream: inputs['x'] * 2), inputs=['x']),
+        Stage('b', stage('b', lambda inputs, upstream: inputs['y'] + 1), inputs=['y']),
+        Stage('c', stage('c', lambda inputs, upstream: upstream['a'] + inputs['z']), inputs=['z'], depends=['a']),
+        Stage('d', stage('d', lambda inputs, upstream: upstream['b'] + upstream['c']), depends=['b', 'c']),
+    ])
+
+
+def test_changing_one_input_reruns_only_its_dependents():
+    calls, memo = [], {}
+    pipeline = counting_pipeline(calls)
+    assert pipeline.run({'x': 1, 'y': 1, 'z': 1}, memo)['d'] == 2 + 3
+    assert sorted(calls) == ['a', 'b', 'c', 'd']
+
+    calls.clear()
+    run = pipeline.run({'x': 1, 'y': 5, 'z': 1}, memo)
+    assert run['d'] == 6 + 3
+    assert sorted(calls) == ['b', 'd']
+    assert [name for name, timing in run.timings.items() if timing['recomputed']] == ['b', 'd']
+
+    calls.clear()
+    assert pipeline.run({'x': 2, 'y': 5, 'z': 1}, memo)['d'] == 6 + 5
+    assert sorted(calls) == ['a', 'c', 'd']
+
+    calls.clear()
+    assert pipeline.run({'x': 2, 'y': 5, 'z': 1}, memo)['d'] == 11
+    assert calls == []
+
+
+def test_stages_are_evaluated_only_when_requested():
+    calls, memo = [], {}
+    run = counting_pipeline(calls).run({'x': 1, 'y': 1, 'z': 1}, memo)
+    assert run['c'] == 3
+    assert sorted(calls) == ['a', 'c'] and 'b' not in memo
+
+    run['c']  # Already evaluated in this run
+    assert sorted(calls) == ['a', 'c']
+
+
+def test_inputs_set_during_a_run_are_used():
+    calls, memo = [], {}
+    pipeline = counting_pipeline(calls)
+    run = pipeline.run({'x': 1, 'y': 1}, memo)
+    run.data['z'] = 10  # As the page does for inputs of widgets further down
+    assert run['c'] == 12
+
+
+def test_stages_must_be_declared_after_their_dependencies():
+    with pytest.raises(ValueError, match="unknown or later"):
+        Pipeline([Stage('c', lambda inputs, upstream: None, depends=['a']), Stage('a', lambda inputs, upstream: None)])
+    with pytest.raises(ValueError, match="Duplicate"):
+        Pipeline([Stage('a', lambda inputs, upstream: None), Stage('a', lambda inputs, upstream: None)])
@@ -0,0 +1,75 @@
+# test_projection.py
+
+import numpy as np
+import pytest
+
+from simulator.projection import project_retirement, profiles_to_array, PROFILE_FIELDS
+
+PROFILE = {
+    'age': 40, 'income': 60000, 'savings': 50000, 'retirement_age': 65, 'post_retirement_expenses': 2000,
+    'savings_growth_rate': 4.0, 'life_expectancy': 85, 'current_cpf_savings': 80000, 'cpf_contribution_rate': 20,
+}
+
+
+def loop_projection(profile):
+    """The per-year loop of the original savings chart: contribute to CPF, then grow both balances."""
+    cpf, savings = profile['current_cpf_savings'], profile['savings']
+    growth = 1 + profile['savings_growth_rate'] / 100
+    totals = [cpf + savings]
+    for _ in range(profile['retirement_age'] - profile['age']):
+        cpf = (cpf + profile['income'] * profile['cpf_contribution_rate'] / 100) * growth
+        savings *= growth
+        totals.append(cpf + savings)
+    for _ in range(profile['life_expectancy'] - profile['retirement_age']):
+        totals.append(max(totals[-1] - profile['post_retirement_expenses'] * 12, 0))
+    return np.array(totals)
+
+
+@pytest.mark.parametrize("overrides", [{}, {'savings_growth_rate': 0.0}, {'post_retirement_expenses': 8000},
+                                       {'age': 64, 'retirement_age': 65}])
+def test_matches_the_yearly_loop(overrides):
+    profile = dict(PROFILE, **overrides)
+    projection = project_retirement(profile)
+    expected = loop_projection(profile)
+
+    np.testing.assert_allclose(projection['total'], expected, rtol=1e-9)
+    np.testing.assert_array_equal(projection['ages'], np.arange(profile['age'], profile['life_expectancy'] + 1))
+    at_retirement = expected[profile['retirement_age'] - profile['age']]
+    expenses = profile['post_retirement_expenses'] * 12 * (profile['life_expectancy'] - profile['retirement_age'])
+    assert projection['total_savings_at_retirement'] == pytest.approx(at_retirement)
+    assert projection['sustainable'] == (at_retirement >= expenses)
+
+
+def test_batch_matches_single_profiles():
+    profiles = [PROFILE, dict(PROFILE, age=30, income=90000), dict(PROFILE, retirement_age=70, life_expectancy=95)]
+    batch = project_retirement(profiles, with_path=False)
+    for position, profile in enumerate(profiles):
+        single = project_retirement(profile, with_path=False)
+        for key in ('total_savings_at_retirement', 'total_post_retirement_expenses', 'depletion_age', 'sustainable'):
+            assert batch[key][position] == pytest.approx(single[key])
+
+
+def test_profiles_to_array_accepts_every_layout():
+    expected = np.array([[PROFILE[field] for field in PROFILE_FIELDS]], dtype=float)
+    np.testing.assert_array_equal(profiles_to_array(PROFILE), expected)
+    np.testing.assert_array_equal(profiles_to_array([PROFILE]), expected)
+    np.testing.assert_array_equal(profiles_to_array(expected), expected)
+
+
+def test_already_retired_starts_drawing_down_today():
+    projection = project_retirement(dict(PROFILE, age=70, retirement_age=65))
+    assert projection['drawdown_start_age'] == 70
+    assert projection['total'][1] == pytest.approx(projection['total'][0] - 24000)
+
+
+def test_retirement_past_life_expectancy_withdraws_nothing():
+    profile = dict(PROFILE, retirement_age=90, life_expectancy=85)
+    projection = project_retirement(profile)
+    np.testing.assert_allclose(projection['total'], projection['cpf'] + projection['savings'])
+    assert projection['total_post_retirement_expenses'] == 0
+    assert projection['sustainable']
+
+
+def test_unknown_cpf_model_is_rejected():
+    with pytest.raises(ValueError):
+        project_retirement(PROFILE, cpf_model='quarterly')
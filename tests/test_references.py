@@ -0,0 +1,31 @@
+# test_references.py
+
+from knowledge_graph.references import generate_references
+
+URL_MAP = {'URL1': 'https://cpf.gov.sg/one', 'URL2': 'https://cpf.gov.sg/two', 'URL3': 'https://cpf.gov.sg/three',
+           'URL12': 'https://cpf.gov.sg/twelve'}
+
+
+def test_references_follow_the_order_of_first_citation():
+    prose = "The SA closes at 55 [URL3]. Savings move to the RA [URL1], as set out in [URL3] and [URL2]."
+    assert generate_references(prose, URL_MAP) == ("- [URL3] https://cpf.gov.sg/three\n"
+                                                   "- [URL1] https://cpf.gov.sg/one\n"
+                                                   "- [URL2] https://cpf.gov.sg/two")
+
+
+def test_repeated_placeholders_are_listed_once():
+    prose = "[URL2] says so. So does [URL2], and again URL2."
+    assert generate_references(prose, URL_MAP) == "- [URL2] https://cpf.gov.sg/two"
+
+
+def test_placeholders_without_a_source_are_dropped():
+    prose = "See [URL7] and [URL1]; URL120 is not URL12."
+    assert generate_references(prose, URL_MAP) == "- [URL1] https://cpf.gov.sg/one\n- [URL12] https://cpf.gov.sg/twelve"
+
+
+def test_uncited_prose_lists_every_source():
+    assert generate_references("No citations here.", URL_MAP) == "\n".join(
+        ["Sources consulted:"] + [f"- {url}" for url in URL_MAP.values()])
+    assert generate_references("Only [URL9].", {'URL1': 'https://cpf.gov.sg/one'}) == (
+        "Sources consulted:\n- https://cpf.gov.sg/one")
+    assert generate_references("[URL1]", {}) == "No sources available."
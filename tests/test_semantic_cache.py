@@ -0,0 +1,56 @@
+# test_semantic_cache.py
+
+import numpy as np
+
+from llm.semantic_cache import SemanticCache
+
+
+def unit(*components, dimension=4):
+    vector = np.zeros(dimension)
+    vector[:len(components)] = components
+    return vector
+
+
+def test_lookup_finds_the_closest_query_above_the_threshold():
+    cache = SemanticCache(4, threshold=0.9)
+    cache.add("a", unit(1, 0))
+    cache.add("b", unit(0, 1))
+
+    key, similarity = cache.lookup(unit(10, 1))  # Scale does not matter
+    assert key == "a" and similarity > 0.99
+    assert cache.lookup(unit(1, 1)) is None  # 0.71 to both
+    assert cache.lookup(unit(1, 1), threshold=0.7)[0] in ("a", "b")
+    assert SemanticCache(4).lookup(unit(1)) is None
+
+
+def test_add_replaces_an_existing_key():
+    cache = SemanticCache(4)
+    cache.add("a", unit(1, 0))
+    cache.add("a", unit(0, 1))
+    assert len(cache) == 1
+    assert cache.lookup(unit(0, 1))[0] == "a" and cache.lookup(unit(1, 0)) is None
+
+
+def test_discard_keeps_the_remaining_keys_findable():
+    cache = SemanticCache(4)
+    for position, key in enumerate("abcd"):
+        cache.add(key, np.eye(4)[position])
+    cache.discard("b")  # "d" moves into its row
+    cache.discard("missing")
+
+    assert len(cache) == 3
+    assert cache.lookup(np.eye(4)[1]) is None
+    for position, key in zip((0, 2, 3), "acd"):
+        assert cache.lookup(np.eye(4)[position])[0] == key
+
+
+def test_matrix_grows_past_its_initial_capacity():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, 8))
+    cache = SemanticCache(8, threshold=0.999, initial_capacity=2)
+    for position, vector in enumerate(vectors):
+        cache.add(position, vector)
+
+    assert len(cache) == 20
+    for position, vector in enumerate(vectors):
+        assert cache.lookup(vector)[0] == position
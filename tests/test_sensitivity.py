@@ -0,0 +1,38 @@
+# test_sensitivity.py
+
+import numpy as np
+import pytest
+
+from simulator.projection import project_retirement
+from simulator.sensitivity import sustainability_grid, GROWTH_RATES, RETIREMENT_AGES, CPF_CONTRIBUTION_RATES
+
+PROFILE = {
+    'age': 40, 'income': 60000, 'savings': 50000, 'retirement_age': 65, 'post_retirement_expenses': 3000,
+    'savings_growth_rate': 4.0, 'life_expectancy': 85, 'current_cpf_savings': 80000, 'cpf_contribution_rate': 20,
+}
+
+
+def surplus(profile):
+    summary = project_retirement(profile, with_path=False)
+    return summary['total_savings_at_retirement'] - summary['total_post_retirement_expenses']
+
+
+def test_grid_covers_the_slider_ranges():
+    grid = sustainability_grid(PROFILE)
+    assert grid['surplus'].shape == (len(GROWTH_RATES), len(RETIREMENT_AGES), len(CPF_CONTRIBUTION_RATES))
+
+
+@pytest.mark.parametrize("growth, retirement, cpf", [(0, 0, 0), (40, 10, 40), (100, 15, 74), (25, 3, 7)])
+def test_cell_matches_the_projection(growth, retirement, cpf):
+    grid = sustainability_grid(PROFILE)
+    profile = dict(PROFILE, savings_growth_rate=GROWTH_RATES[growth], retirement_age=RETIREMENT_AGES[retirement],
+                   cpf_contribution_rate=CPF_CONTRIBUTION_RATES[cpf])
+    assert grid['surplus'][growth, retirement, cpf] == pytest.approx(surplus(profile), rel=1e-12, abs=1e-6)
+
+
+def test_custom_axes_for_a_retiree():
+    retiree = dict(PROFILE, age=70)
+    grid = sustainability_grid(retiree, growth_rates=[1.0, 5.0], retirement_ages=[60, 75], cpf_contribution_rates=[20])
+    expected = [[surplus(dict(retiree, savings_growth_rate=growth, retirement_age=age)) for age in (60, 75)]
+                for growth in (1.0, 5.0)]
+    np.testing.assert_allclose(grid['surplus'][:, :, 0], expected, rtol=1e-12)
@@ -0,0 +1,16 @@
+# test_verdict.py
+
+import pytest
+
+from llm.verdict import parse_verdict
+
+
+@pytest.mark.parametrize("reply", ["Valid", "valid", "\nValid.", '"Valid"', "**Valid**", "Valid - it is about CPF LIFE"])
+def test_valid_replies(reply):
+    assert parse_verdict(reply) is True
+
+
+@pytest.mark.parametrize("reply", ["Invalid", "invalid.", "This query is not valid", "Not valid", "The query is valid",
+                                   "Validity unclear", "", "   "])
+def test_everything_else_is_invalid(reply):
+    assert parse_verdict(reply) is False